@@ -0,0 +1,208 @@
+"""Benchmark suite for the label rendering path.
+
+Runs label_core.generate_pdf headlessly on synthetic part number sets and
+reports labels/sec, peak RSS and output PDF size for every case. Each case
+runs in a fresh interpreter so peak RSS and the QR cache start clean.
+
+Examples:
+    python bench_labels.py                          # full matrix (1k, 10k, 100k)
+    python bench_labels.py --sizes 1000 --json run.json
+    python bench_labels.py --sizes 1000 --compare baseline.json
+    python bench_labels.py --set fast_qr=false --filter qr_on   # qrcode's own encoder
+    python bench_labels.py --conformance 5000       # NumPy QR encoder vs qrcode
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import string
+import subprocess
+import sys
+import tempfile
+import time
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+DUPLICATED_UNIQUE_COUNT = 50  # Distinct part numbers in the 'duplicated' sets
+# Settings varied by the case matrix; --filter selects them instead of --set
+MATRIX_FIELDS = ('enable_qr', 'dynamic_text_size')
+
+def synthetic_parts(count, distribution):
+    # 'unique': every label differs; 'duplicated': a few bin labels repeated
+    if distribution == 'unique':
+        return (f"PN-{i:08d}" for i in range(count))
+    return (f"BIN-{i % DUPLICATED_UNIQUE_COUNT:04d}" for i in range(count))
+
+def conformance_payloads(count, seed=0):
+    # Payloads of every QR data mode, mixed-mode strings and lengths that
+    # cover small and large versions (including version information blocks)
+    rng = random.Random(seed)
+    alphabets = (string.digits, string.ascii_uppercase + string.digits + ' $%*+-./:',
+                 string.printable, string.digits + 'AB', 'äöü€漢字abc')
+    lengths = (1, 2, 5, 9, 12, 19, 20, 21, 30, 50, 80, 120, 200, 400)
+    for i in range(count):
+        yield ''.join(rng.choice(rng.choice(alphabets)) for _ in range(rng.choice(lengths)))
+
+def run_conformance(count):
+    # Compare qr_encoder with the qrcode package for every error correction
+    # level; returns the number of mismatching payloads
+    import qr_encoder
+    if not qr_encoder.AVAILABLE:
+        raise SystemExit("conformance check needs NumPy")
+    payloads = list(conformance_payloads(count))
+    failures = 0
+    for error_correction in range(4):
+        mismatches = qr_encoder.check_conformance(payloads, error_correction, border=4)
+        failures += len(mismatches)
+        print(f"error correction {error_correction}: {len(payloads) - len(mismatches)}/{len(payloads)} identical",
+              flush=True)
+        for payload in mismatches[:5]:
+            print(f"  mismatch: {payload!r}")
+    return failures
+
+def peak_rss_bytes():
+    # Peak resident set size of this process, or None where unavailable
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        info = psutil.Process().memory_info()
+        return getattr(info, 'peak_wset', info.rss)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def iter_cases(sizes):
+    for size, distribution, enable_qr, dynamic_text_size in itertools.product(
+            sizes, ('unique', 'duplicated'), (True, False), (False, True)):
+        yield {
+            'labels': size,
+            'distribution': distribution,
+            'enable_qr': enable_qr,
+            'dynamic_text_size': dynamic_text_size,
+        }
+
+def case_name(case):
+    return (f"{case['labels']}-{case['distribution']}"
+            f"-qr_{'on' if case['enable_qr'] else 'off'}"
+            f"-dyn_{'on' if case['dynamic_text_size'] else 'off'}")
+
+def run_case(case, settings_overrides):
+    # Executed in the child interpreter
+    from label_core import LabelSettings, generate_pdf
+
+    settings = LabelSettings(enable_qr=case['enable_qr'], dynamic_text_size=case['dynamic_text_size'],
+                             **settings_overrides)
+    with tempfile.TemporaryDirectory() as tmp:
+        output_file = os.path.join(tmp, 'bench.pdf')
+        start = time.perf_counter()
+        result = generate_pdf(synthetic_parts(case['labels'], case['distribution']), output_file, settings)
+        elapsed = time.perf_counter() - start
+        pdf_bytes = os.path.getsize(output_file)
+
+    return dict(
+        case,
+        name=case_name(case),
+        seconds=elapsed,
+        labels_per_sec=result.label_count / elapsed if elapsed > 0 else None,
+        peak_rss_bytes=peak_rss_bytes(),
+        pdf_bytes=pdf_bytes,
+        bytes_per_label=pdf_bytes / result.label_count if result.label_count else None,
+        sheets=result.sheet_count,
+        timings=result.timings,
+    )
+
+def run_case_in_subprocess(case, settings_overrides):
+    command = [sys.executable, os.path.abspath(__file__), '--run-case',
+               json.dumps({'case': case, 'settings': settings_overrides})]
+    completed = subprocess.run(command, capture_output=True, text=True,
+                               cwd=os.path.dirname(os.path.abspath(__file__)))
+    if completed.returncode != 0:
+        raise RuntimeError(f"{case_name(case)} failed:\n{completed.stderr}")
+    return json.loads(completed.stdout)
+
+def format_bytes(value):
+    if value is None:
+        return 'n/a'
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if value < 1024 or unit == 'GB':
+            return f"{value:.1f} {unit}" if unit != 'B' else f"{value} B"
+        value /= 1024
+
+def print_row(result, baseline=None):
+    line = (f"{result['name']:<36} {result['labels_per_sec']:>10.0f} labels/s "
+            f"{format_bytes(result['peak_rss_bytes']):>10} RSS "
+            f"{format_bytes(result['pdf_bytes']):>10} PDF")
+    if baseline is not None and baseline.get('labels_per_sec'):
+        change = result['labels_per_sec'] / baseline['labels_per_sec'] - 1
+        size_change = result['pdf_bytes'] / baseline['pdf_bytes'] - 1
+        line += f"   speed {change:+.1%}  size {size_change:+.1%}"
+    print(line, flush=True)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the label rendering path.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES),
+                        help="label counts to run (default: %(default)s)")
+    parser.add_argument('--filter', default='', help="only run cases whose name contains this text")
+    parser.add_argument('--set', action='append', default=[], metavar='FIELD=VALUE',
+                        help="override a LabelSettings field for every case, e.g. --set qr_mode=Raster")
+    parser.add_argument('--json', help="write results to this JSON file")
+    parser.add_argument('--compare', help="JSON file from an earlier run to compare against")
+    parser.add_argument('--conformance', type=int, metavar='COUNT',
+                        help="check the NumPy QR encoder against qrcode on COUNT payloads and exit")
+    parser.add_argument('--run-case', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.conformance:
+        return 1 if run_conformance(args.conformance) else 0
+
+    if args.run_case:
+        request = json.loads(args.run_case)
+        print(json.dumps(run_case(request['case'], request['settings'])))
+        return 0
+
+    # Only the overridden fields are passed on, converted to their field types
+    from label_core import LabelSettings
+    overrides = dict(item.split('=', 1) for item in args.set)
+    unknown = set(overrides) - set(LabelSettings.__dataclass_fields__)
+    if unknown:
+        parser.error(f"unknown settings field(s): {', '.join(sorted(unknown))}")
+    varied = set(overrides).intersection(MATRIX_FIELDS)
+    if varied:
+        parser.error(f"--set cannot override {', '.join(sorted(varied))}, which the cases vary; "
+                     f"select cases with --filter instead (e.g. --filter qr_off)")
+    typed = LabelSettings.from_dict(overrides)
+    settings_overrides = {name: getattr(typed, name) for name in overrides}
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = {result['name']: result for result in json.load(f)['results']}
+
+    results = []
+    for case in iter_cases(args.sizes):
+        if args.filter not in case_name(case):
+            continue
+        result = run_case_in_subprocess(case, settings_overrides)
+        results.append(result)
+        print_row(result, baseline.get(result['name']))
+
+    if args.json:
+        report = {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'settings': settings_overrides,
+            'results': results,
+        }
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,42 @@
+"""The cache directory and the installed font index, without reportlab.
+
+font_registry keeps an index of the installed font files in the user's
+cache directory. This module holds its location and reads it without
+importing the rendering libraries, so the GUI can list the families from
+the last scan while it starts up.
+"""
+import json
+import os
+
+CACHE_DIR = os.path.join(
+    os.environ.get('LOCALAPPDATA') or os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+    'Avery5167-QR-Label-Generator')
+INDEX_FILE = os.path.join(CACHE_DIR, 'font_index.json')
+INDEX_VERSION = 1  # Bump when the index or metrics format changes
+
+# reportlab names of the standard PDF fonts by (bold, italic); these need no file
+STANDARD_FAMILIES = {
+    'Courier': {(False, False): 'Courier', (True, False): 'Courier-Bold',
+                (False, True): 'Courier-Oblique', (True, True): 'Courier-BoldOblique'},
+    'Helvetica': {(False, False): 'Helvetica', (True, False): 'Helvetica-Bold',
+                  (False, True): 'Helvetica-Oblique', (True, True): 'Helvetica-BoldOblique'},
+    'Times': {(False, False): 'Times-Roman', (True, False): 'Times-Bold',
+              (False, True): 'Times-Italic', (True, True): 'Times-BoldItalic'},
+}
+
+def load_index():
+    # {path: [mtime_ns, size, faces]} from the last scan; {} if there is none
+    # or it has an older format
+    try:
+        with open(INDEX_FILE, encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return index.get('fonts', {}) if index.get('version') == INDEX_VERSION else {}
+
+def family_names(fonts):
+    # Standard and indexed family names, sorted
+    names = set(STANDARD_FAMILIES)
+    for _, _, faces in fonts.values():
+        names.update(face[0] for face in faces)
+    return sorted(names)
@@ -0,0 +1,270 @@
+"""TrueType fonts for label text, alongside the standard PDF fonts.
+
+Font files are found in the usual system and user font directories (plus
+any listed in LABEL_FONT_PATH) and grouped into families by the names in
+their 'name' table. Only the few header tables needed for that are read, and
+the result is kept in an index in the user's cache directory, so later runs
+only stat the files.
+
+A family is registered with reportlab the first time a job uses it. The
+glyph widths used to measure text are kept in a metrics cache as well, so
+registering a font and fitting text does not parse the font file; it is only
+parsed when text is drawn. reportlab embeds just the glyphs a document uses
+(a subset), not the whole font.
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+from weakref import WeakKeyDictionary
+
+from reportlab import rl_config
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTEncoding, TTFont, TTFontFace
+
+from font_index import CACHE_DIR, INDEX_FILE, INDEX_VERSION, STANDARD_FAMILIES, family_names, load_index
+
+METRICS_DIR = os.path.join(CACHE_DIR, 'font_metrics')
+FONT_EXTENSIONS = ('.ttf', '.otf', '.ttc')
+# Installed families whose glyphs stand in for the standard fonts outside
+# PDF (raster output), metric-compatible ones first
+SUBSTITUTE_FAMILIES = {
+    'Courier': ('Liberation Mono', 'Cousine', 'Courier New', 'Nimbus Mono PS', 'DejaVu Sans Mono'),
+    'Helvetica': ('Liberation Sans', 'Arimo', 'Arial', 'Helvetica', 'Nimbus Sans', 'DejaVu Sans'),
+    'Times': ('Liberation Serif', 'Tinos', 'Times New Roman', 'Nimbus Roman', 'DejaVu Serif'),
+}
+STYLE_SUFFIXES = {(False, False): '', (True, False): '-Bold', (False, True): '-Italic', (True, True): '-BoldItalic'}
+
+_lock = threading.Lock()
+# Indexed families, whether the font directories were scanned in this
+# process, and registered font names
+_state = {'families': None, 'scanned': False, 'registered': set()}
+
+def font_directories():
+    # Directories searched for font files, LABEL_FONT_PATH entries first
+    home = os.path.expanduser('~')
+    directories = [path for path in os.environ.get('LABEL_FONT_PATH', '').split(os.pathsep) if path]
+    if os.environ.get('WINDIR'):
+        directories.append(os.path.join(os.environ['WINDIR'], 'Fonts'))
+    if os.environ.get('LOCALAPPDATA'):
+        directories.append(os.path.join(os.environ['LOCALAPPDATA'], 'Microsoft', 'Windows', 'Fonts'))
+    directories += [
+        os.path.join(home, 'Library', 'Fonts'), '/Library/Fonts', '/System/Library/Fonts',
+        os.path.join(home, '.fonts'), os.path.join(home, '.local', 'share', 'fonts'),
+        '/usr/share/fonts', '/usr/local/share/fonts',
+    ]
+    return [directory for directory in directories if os.path.isdir(directory)]
+
+def _name(data, offset, name_id):
+    # A string from the 'name' table at offset, preferring English Windows names
+    count, strings = struct.unpack_from('>HH', data, offset + 2)
+    found = {}
+    for record in range(count):
+        platform, encoding, language, record_id, length, start = struct.unpack_from('>6H', data, offset + 6 + 12 * record)
+        if record_id == name_id:
+            start += offset + strings
+            found[platform, encoding, language] = bytes(data[start:start + length])
+    for key, codec in (((3, 1, 0x409), 'utf-16-be'), ((3, 10, 0x409), 'utf-16-be'), ((1, 0, 0), 'mac_roman')):
+        if key in found:
+            return found[key].decode(codec, errors='replace').strip()
+    for (platform, encoding, language), value in found.items():
+        if platform in (0, 3):
+            return value.decode('utf-16-be', errors='replace').strip()
+    return None
+
+def _font_faces(path):
+    # [family, bold, italic, subfont index] for every usable face in a font
+    # file. Faces with PostScript (CFF) outlines or a licence that forbids
+    # embedding are left out since reportlab cannot embed them.
+    faces = []
+    try:
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if data[:4] == b'ttcf':
+                offsets = struct.unpack_from(f">{struct.unpack_from('>L', data, 8)[0]}L", data, 12)
+            else:
+                offsets = (0,)
+            for index, offset in enumerate(offsets):
+                tables = {}
+                for table in range(struct.unpack_from('>H', data, offset + 4)[0]):
+                    tag, _, start, _ = struct.unpack_from('>4sLLL', data, offset + 12 + 16 * table)
+                    tables[tag] = start
+                if not {b'glyf', b'head', b'name'} <= tables.keys():
+                    continue
+                if b'OS/2' in tables:
+                    fs_type = struct.unpack_from('>H', data, tables[b'OS/2'] + 8)[0]
+                    if fs_type == 0x0002 or fs_type & 0x0300:
+                        continue
+                mac_style = struct.unpack_from('>H', data, tables[b'head'] + 44)[0]
+                family = _name(data, tables[b'name'], 1)
+                if family:
+                    faces.append([family, bool(mac_style & 1), bool(mac_style & 2), index])
+    except (OSError, ValueError, struct.error):
+        pass  # Unreadable, empty or truncated file
+    return faces
+
+def _save_json(path, value):
+    # Cache files only save time, so failing to write one is not an error
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(value, f)
+        os.replace(path + '.tmp', path)
+    except OSError:
+        pass
+
+def _scan_fonts(index):
+    # Fresh index of the font directories; files unchanged since the cached
+    # index are not read again
+    fonts = {}
+    for directory in font_directories():
+        for root, _, names in os.walk(directory):
+            for name in sorted(names):
+                if not name.lower().endswith(FONT_EXTENSIONS):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entry = index.get(path)
+                if entry is None or entry[:2] != [stat.st_mtime_ns, stat.st_size]:
+                    entry = [stat.st_mtime_ns, stat.st_size, _font_faces(path)]
+                fonts[path] = entry
+    if fonts != index:
+        _save_json(INDEX_FILE, {'version': INDEX_VERSION, 'fonts': fonts})
+    return fonts
+
+def _group_families(fonts):
+    # {family: {(bold, italic): (path, subfont index)}}; the first file found
+    # for a style wins and the standard families cannot be replaced
+    families = {}
+    for path, (_, _, faces) in fonts.items():
+        for family, bold, italic, subfont_index in faces:
+            if family not in STANDARD_FAMILIES:
+                families.setdefault(family, {}).setdefault((bold, italic), (path, subfont_index))
+    return families
+
+def font_families():
+    # Standard and installed family names, sorted, rescanning the font directories
+    with _lock:
+        fonts = _scan_fonts(load_index())
+        _state['families'] = _group_families(fonts)
+        _state['scanned'] = True
+        return family_names(fonts)
+
+def _find_family(family):
+    # Styles of an installed family. The cached index is tried first so that
+    # jobs do not walk the font directories; a miss rescans them (once per
+    # process, since families are looked up repeatedly)
+    if _state['families'] is None:
+        _state['families'] = _group_families(load_index())
+    styles = _state['families'].get(family)
+    stale = styles is None or not all(os.path.exists(path) for path, _ in styles.values())
+    if stale and not _state['scanned']:
+        _state['families'] = _group_families(_scan_fonts(load_index()))
+        _state['scanned'] = True
+        styles = _state['families'].get(family)
+    return styles
+
+def _face_metrics(path, subfont_index):
+    # (metrics, parsed face or None): widths and names from the metrics
+    # cache, or from parsing the font file, which is then cached
+    stat = os.stat(path)
+    key = f'{INDEX_VERSION}|{path}|{subfont_index}|{stat.st_mtime_ns}|{stat.st_size}'
+    cache_file = os.path.join(METRICS_DIR, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json')
+    try:
+        with open(cache_file, encoding='utf-8') as f:
+            return json.load(f), None
+    except (OSError, ValueError):
+        pass
+    face = TTFontFace(path, subfontIndex=subfont_index)
+    metrics = {
+        'name': face.name.decode('latin-1'),
+        'default_width': face.defaultWidth,
+        'ascent': face.ascent,
+        'descent': face.descent,
+        'codes': list(face.charWidths),
+        'widths': list(face.charWidths.values()),
+    }
+    _save_json(cache_file, metrics)
+    return metrics, face
+
+class _CachedFace:
+    # Stand-in for reportlab's TTFontFace built from cached metrics. Text
+    # measurement and registration only read the attributes set here; any
+    # other attribute (glyph lookup and subsetting while drawing) parses the
+    # font file on first use.
+    def __init__(self, path, subfont_index, metrics, face=None):
+        self._path = path
+        self._subfont_index = subfont_index
+        self._face = face
+        self.name = metrics['name'].encode('latin-1')
+        self.charWidths = dict(zip(metrics['codes'], metrics['widths']))
+        self.defaultWidth = metrics['default_width']
+        self.ascent = metrics['ascent']
+        self.descent = metrics['descent']
+
+    def __getattr__(self, name):
+        # Only called for attributes not set in __init__
+        if name.startswith('__'):
+            raise AttributeError(name)
+        if self._face is None:
+            self._face = TTFontFace(self._path, subfontIndex=self._subfont_index)
+        return getattr(self._face, name)
+
+class CachedTTFont(TTFont):
+    # TTFont with a _CachedFace, since TTFont.__init__ always parses the file
+    def __init__(self, name, path, subfont_index):
+        metrics, face = _face_metrics(path, subfont_index)
+        self.fontName = name
+        self.face = _CachedFace(path, subfont_index, metrics, face)
+        self.encoding = TTEncoding()
+        self.state = WeakKeyDictionary()
+        self._asciiReadable = rl_config.ttfAsciiReadable
+        self.shapable = False  # Labels draw plain strings
+
+def _nearest_style(styles, bold, italic):
+    # (path, subfont index) of the requested style, or the nearest one the family has
+    for style in ((bold, italic), (bold, False), (False, italic), (False, False)):
+        if style in styles:
+            return styles[style]
+    return next(iter(styles.values()))
+
+def font_file(family, bold=False, italic=False):
+    # (path, subfont index) of a font file with the glyphs of a family and
+    # style, for drawing text outside reportlab. Standard families use the
+    # first installed substitute. None when no file is found.
+    with _lock:
+        for candidate in SUBSTITUTE_FAMILIES.get(family, (family,)):
+            styles = _find_family(candidate)
+            if styles:
+                return _nearest_style(styles, bold, italic)
+    return None
+
+def truetype_file(family, bold=False, italic=False):
+    # (path, subfont index) of the TrueType file font_name uses for a family
+    # and style; None for the standard PDF fonts and unknown families
+    if family in STANDARD_FAMILIES:
+        return None
+    with _lock:
+        styles = _find_family(family)
+        return _nearest_style(styles, bold, italic) if styles else None
+
+def font_name(family, bold=False, italic=False):
+    # reportlab font name for a family and style, registering TrueType fonts
+    # on first use. A missing style falls back to the nearest one the family
+    # has. Raises ValueError for unknown families.
+    if family in STANDARD_FAMILIES:
+        return STANDARD_FAMILIES[family][bold, italic]
+    with _lock:
+        name = family + STYLE_SUFFIXES[bold, italic]
+        if name in _state['registered']:
+            return name
+        styles = _find_family(family)
+        if not styles:
+            raise ValueError(f"Font family {family!r} is not a standard PDF font and no TrueType file was found for it.")
+        pdfmetrics.registerFont(CachedTTFont(name, *_nearest_style(styles, bold, italic)))
+        _state['registered'].add(name)
+        return name
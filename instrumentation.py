@@ -0,0 +1,139 @@
+"""Optional per-stage timing for the label rendering loop.
+
+generate_pdf wraps each stage of its per-label work in ``timer.stage(name)``.
+By default the shared NULL_TIMER is used, whose stages do nothing, so the cost
+when instrumentation is off is one method call per stage. Pass a StageTimer to
+collect cumulative times and per-label histograms, and optionally a callback
+that receives every (stage, seconds) measurement for external metrics.
+"""
+import csv
+import json
+import time
+from collections import defaultdict
+
+# Stages timed by label_core, in the order they happen for a label
+STAGES = (
+    'qr_matrix',     # QR encoding, timed per chunk where it runs and spread over the chunk's labels
+    'qr_wait',       # Waiting for the encoding workers, per label (process pool only)
+    'qr_image',      # Building the PIL image (raster mode)
+    'qr_png',        # PNG encoding (raster mode)
+    'qr_draw',       # Writing the QR form XObject and drawing it
+    'text_measure',  # Fitting the text (dynamic text size)
+    'text_draw',     # Drawing the text
+    'save',          # Writing the PDF (canvas.save and segment merging)
+)
+
+def _bucket(seconds):
+    # Histogram bucket: upper bound in microseconds, powers of two
+    return 1 << int(seconds * 1e6).bit_length()
+
+class _Stage:
+    __slots__ = ('timer', 'name', 'start')
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.timer.record(self.name, time.perf_counter() - self.start)
+        return False
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+class NullTimer:
+    # Instrumentation switched off: every call is a no-op
+    enabled = False
+    _stage = _NullStage()
+
+    def stage(self, name):
+        return self._stage
+
+    def record(self, name, seconds, count=1):
+        pass
+
+    def report(self):
+        return {}
+
+NULL_TIMER = NullTimer()
+
+class StageTimer:
+    enabled = True
+
+    def __init__(self, callback=None):
+        # callback(stage, seconds) is called for every measurement
+        self.callback = callback
+        self.totals = defaultdict(float)
+        self.counts = defaultdict(int)
+        self.histograms = defaultdict(lambda: defaultdict(int))
+
+    def __getstate__(self):
+        # Callbacks stay in the parent process when timers are sent to workers
+        return {'totals': dict(self.totals), 'counts': dict(self.counts),
+                'histograms': {name: dict(h) for name, h in self.histograms.items()}}
+
+    def __setstate__(self, state):
+        self.__init__()
+        self.merge(state)
+
+    def stage(self, name):
+        return _Stage(self, name)
+
+    def record(self, name, seconds, count=1):
+        # count > 1 records that many observations of seconds each, e.g. a
+        # batch's time divided evenly over the labels in it
+        self.totals[name] += seconds * count
+        self.counts[name] += count
+        self.histograms[name][_bucket(seconds)] += count
+        if self.callback is not None:
+            for _ in range(count):
+                self.callback(name, seconds)
+
+    def merge(self, report):
+        # Add a report() (e.g. from a shard rendered in another process)
+        for name, total in report.get('totals', {}).items():
+            self.totals[name] += total
+        for name, count in report.get('counts', {}).items():
+            self.counts[name] += count
+        for name, histogram in report.get('histograms', {}).items():
+            for bucket, count in histogram.items():
+                self.histograms[name][int(bucket)] += count
+
+    def report(self):
+        # Cumulative seconds, call counts and histograms of per-call durations
+        # keyed by bucket upper bound in microseconds
+        return {
+            'totals': dict(self.totals),
+            'counts': dict(self.counts),
+            'histograms': {name: dict(sorted(h.items())) for name, h in self.histograms.items()},
+        }
+
+    def write_json(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=2)
+
+    def write_csv(self, path):
+        # One row per stage and histogram bucket
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['stage', 'total_seconds', 'count', 'bucket_max_us', 'bucket_count'])
+            for name in sorted(self.totals, key=lambda n: STAGES.index(n) if n in STAGES else len(STAGES)):
+                for bucket, count in sorted(self.histograms[name].items()):
+                    writer.writerow([name, f"{self.totals[name]:.6f}", self.counts[name], bucket, count])
+
+    def write(self, path):
+        # Format chosen by extension: .csv, anything else is JSON
+        if path.lower().endswith('.csv'):
+            self.write_csv(path)
+        else:
+            self.write_json(path)
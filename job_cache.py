@@ -0,0 +1,110 @@
+"""On-disk cache of rendered sheets for incremental re-generation.
+
+Every sheet of a job is keyed by a hash of its label payloads, its first
+slot and the settings that affect rendering. A sheet whose key is already
+cached is reused as is; only new or changed sheets are rendered, and the
+output is assembled from the per-sheet PDFs with pdf_merge. A manifest per
+output file records the keys of the last run, which tells which sheets
+changed since then (the delta to reprint).
+"""
+import hashlib
+import json
+import os
+from dataclasses import asdict
+
+import reportlab
+
+import font_registry
+
+CACHE_VERSION = 1  # Bump when rendering changes so old sheets are not reused
+MAX_CACHED_SHEETS = 50000  # Least recently used sheets beyond this are removed
+
+# Settings that change how a job is run but not what its sheets look like
+NON_RENDER_FIELDS = frozenset({
+    'start_index',  # Part of each sheet's key as its first slot instead
+    'qr_workers', 'fast_qr', 'flush_sheets', 'shard_sheets', 'shard_workers', 'keep_shards',
+    'job_cache_dir', 'delta_output',
+})
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class JobCache:
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(os.path.join(directory, 'jobs'), exist_ok=True)
+
+    @staticmethod
+    def settings_fingerprint(settings):
+        # Rendering settings as a stable string; the logo is included by
+        # content and a TrueType font file by path, modification time and size
+        values = {name: value for name, value in asdict(settings).items() if name not in NON_RENDER_FIELDS}
+        if settings.logo_file:
+            values['logo_file'] = _file_digest(settings.logo_file)
+        font_file = font_registry.truetype_file(settings.font_family, settings.font_bold, settings.font_italic)
+        if font_file is not None:
+            path, subfont_index = font_file
+            stat = os.stat(path)
+            values['font_file'] = [path, subfont_index, stat.st_mtime_ns, stat.st_size]
+        return json.dumps([CACHE_VERSION, reportlab.Version, values], sort_keys=True)
+
+    @staticmethod
+    def sheet_key(fingerprint, first_slot, parts):
+        payload = json.dumps([fingerprint, first_slot, parts], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def sheet_path(self, key):
+        # Spread over 256 subdirectories to keep directories small
+        return os.path.join(self.directory, key[:2], key + '.pdf')
+
+    def lookup(self, key):
+        # Path of the cached sheet, or None. Hits are touched so that pruning
+        # removes the least recently used sheets first.
+        path = self.sheet_path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def store(self, key, rendered_path):
+        # Move a freshly rendered sheet PDF into the cache
+        path = self.sheet_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(rendered_path, path)
+        return path
+
+    def _manifest_path(self, output_file):
+        name = hashlib.sha1(os.path.abspath(output_file).encode('utf-8')).hexdigest()[:20]
+        return os.path.join(self.directory, 'jobs', name + '.json')
+
+    def load_manifest(self, output_file):
+        # Sheet keys of the last run that wrote output_file ([] if none)
+        try:
+            with open(self._manifest_path(output_file), encoding='utf-8') as f:
+                return json.load(f)['sheets']
+        except (OSError, ValueError, KeyError):
+            return []
+
+    def save_manifest(self, output_file, keys):
+        path = self._manifest_path(output_file)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({'output_file': os.path.abspath(output_file), 'sheets': keys}, f)
+        os.replace(path + '.tmp', path)
+
+    def prune(self, max_sheets=MAX_CACHED_SHEETS):
+        # Remove the least recently used sheets beyond max_sheets
+        sheets = []
+        for entry in os.scandir(self.directory):
+            if entry.is_dir() and len(entry.name) == 2:
+                sheets.extend(sheet for sheet in os.scandir(entry.path) if sheet.name.endswith('.pdf'))
+        if len(sheets) <= max_sheets:
+            return 0
+        sheets.sort(key=lambda sheet: sheet.stat().st_mtime)
+        for sheet in sheets[:len(sheets) - max_sheets]:
+            os.remove(sheet.path)
+        return len(sheets) - max_sheets
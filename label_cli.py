@@ -0,0 +1,125 @@
+"""Command line front end for headless label generation.
+
+Example:
+    python label_cli.py parts.txt -o labels.pdf --no-center-vertically --json
+    some-export | python label_cli.py - -o labels.pdf
+    python label_cli.py --sequence 'BIN-A-{00001..50000}' -o bins.pdf
+    python label_cli.py export.csv --column "Part Number" -o labels.pdf
+    python label_cli.py parts.txt -o labels.tif --dpi 600
+"""
+import argparse
+import dataclasses
+import itertools
+import json
+import os
+import sys
+
+from instrumentation import StageTimer
+from label_core import LabelSettings, generate_pdf
+from part_sources import PartFile
+from sequences import count_lines, expand_lines
+
+def read_part_numbers(stream):
+    # One part number per line; blank lines are ignored and sequence specs
+    # (e.g. BIN-{0001..5000}) are expanded like in the GUI. Lines are
+    # yielded lazily so large inputs are never held in memory.
+    return expand_lines(stream)
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='make-labels',
+        description="Generate Avery 5167 QR code label sheets as PDF.",
+    )
+    parser.add_argument('input', nargs='?',
+                        help="file with one part number or sequence spec per line ('-' for stdin, the default "
+                             "unless --sequence is given)")
+    parser.add_argument('--column', default='0',
+                        help="CSV/TSV input: header name or index of the part number column (default: first)")
+    parser.add_argument('--header', action=argparse.BooleanOptionalAction, default=None,
+                        help="CSV/TSV input: whether the first row holds column names (default: detected; "
+                             "assumed when --column is a name)")
+    parser.add_argument('--sequence', action='append', default=[], metavar='SPEC',
+                        help="add a serial run such as 'BIN-A-{00001..50000}' or '{1..999..2:luhn}' "
+                             "after the input (repeatable)")
+    parser.add_argument('-o', '--output', required=True,
+                        help="PDF file to write, or .tif/.tiff, .pbm or .pgm for page images")
+    parser.add_argument('--dpi', type=int, help="resolution of page images (default: 300)")
+    parser.add_argument('--grayscale', action='store_true',
+                        help="write anti-aliased grayscale page images instead of 1-bit")
+    parser.add_argument('--json', action='store_true', help="print the result as JSON")
+    parser.add_argument('--stage-report', metavar='FILE',
+                        help="time each rendering stage and write the report to FILE (.json or .csv)")
+
+    # One option per settings field, e.g. --label-width 44.24 or --no-enable-qr
+    defaults = LabelSettings()
+    group = parser.add_argument_group('label settings')
+    for f in dataclasses.fields(LabelSettings):
+        option = '--' + f.name.replace('_', '-')
+        default = getattr(defaults, f.name)
+        if f.type is bool:
+            group.add_argument(option, dest=f.name, action=argparse.BooleanOptionalAction, default=default)
+        else:
+            group.add_argument(option, dest=f.name, type=f.type, default=default,
+                               help=f"(default: {default})")
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    settings = LabelSettings(**{f.name: getattr(args, f.name) for f in dataclasses.fields(LabelSettings)})
+
+    try:
+        count_lines(args.sequence)  # Reject malformed specs before any output is written
+    except ValueError as e:
+        parser.exit(2, f"make-labels: error: {e}\n")
+
+    # Files are memory-mapped and streamed row by row; stdin is read lazily
+    source = None
+    try:
+        if args.input is None and args.sequence:
+            parts = ()
+        elif args.input in (None, '-'):
+            parts = read_part_numbers(sys.stdin)
+        else:
+            source = PartFile(args.input, args.column, header=args.header)
+            parts = source
+    except (OSError, ValueError) as e:
+        parser.exit(2, f"make-labels: error: {e}\n")
+
+    timer = StageTimer() if args.stage_report else None
+    raster = os.path.splitext(args.output)[1].lower() in ('.tif', '.tiff', '.pbm', '.pgm')
+    if not raster and (args.dpi is not None or args.grayscale):
+        parser.error("--dpi and --grayscale only apply to .tif/.tiff, .pbm and .pgm output")
+    try:
+        if raster:
+            from raster_backend import DEFAULT_DPI, generate_raster  # NumPy and Pillow are only needed here
+            result = generate_raster(itertools.chain(parts, expand_lines(args.sequence)), args.output, settings,
+                                     dpi=DEFAULT_DPI if args.dpi is None else args.dpi, grayscale=args.grayscale,
+                                     timer=timer)
+        else:
+            result = generate_pdf(itertools.chain(parts, expand_lines(args.sequence)), args.output, settings,
+                                  timer=timer)
+    except ValueError as e:
+        parser.exit(2, f"make-labels: error: {e}\n")
+    finally:
+        if source is not None:
+            source.close()
+
+    if timer is not None:
+        timer.write(args.stage_report)
+
+    if args.json:
+        print(json.dumps(dataclasses.asdict(result), indent=2))
+    else:
+        target = f"{len(result.shard_files)} shard files" if result.shard_files else result.output_file
+        print(f"{target}: {result.label_count} labels on {result.sheet_count} sheets "
+              f"in {result.timings['total']:.2f}s, {result.bytes_per_label:.0f} bytes/label")
+        if settings.job_cache_dir:
+            print(f"{result.reused_sheets} sheets reused, changed sheets: "
+                  f"{', '.join(map(str, result.changed_sheets)) or 'none'}"
+                  + (f" (written to {result.delta_file})" if result.delta_file else ''))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
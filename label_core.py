@@ -0,0 +1,817 @@
+"""Layout and rendering core for the Avery 5167 label generator.
+
+This module has no GUI dependencies so it can be driven from the Tk app,
+the command line (label_cli.py) or other scripts on headless machines.
+"""
+from reportlab import rl_config
+from reportlab.pdfbase import pdfdoc
+from reportlab.pdfgen import canvas
+from reportlab.lib.colors import black, toColor
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.utils import ImageReader
+from PIL import Image
+import qrcode
+import io
+import hashlib
+import itertools
+import os
+import tempfile
+import threading
+import time
+import zlib
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, fields, replace
+from typing import Callable, Dict, Iterable, List, Optional
+
+import font_registry
+from instrumentation import NULL_TIMER, StageTimer
+from job_cache import JobCache
+from label_layout import SheetLayout, mm_to_points, points_to_mm
+from pdf_merge import merge_pdfs
+import qr_encoder
+from text_fit import LINE_SPACING, fit_text
+
+__all__ = [
+    'QR_ERROR_CORRECTION', 'QR_BOX_SIZE', 'QR_BORDER', 'QR_CACHE_SIZE', 'QR_CHUNK_SIZE', 'SHEET_FORM_NAME',
+    'HEADER_LOGO_MAX_HEIGHT_MM', 'TEXT_DRAW_METHODS',
+    'encode_qr_matrices', 'encode_qr_matrix', 'qr_matrix_to_image', 'image_to_png', 'qr_cache_stats',
+    'encode_qr_chunk', 'iter_qr_matrices', 'qr_form_name', 'draw_qr_form', 'qr_bitmap_xobject', 'draw_qr_bitmap',
+    'draw_qr_vector', 'place_label_text', 'resolve_color', 'sheet_has_static_content', 'define_sheet_form',
+    'LabelSettings', 'GenerationCancelled', 'GenerationResult', 'binary_streams', 'generate_pdf', 'iter_shards',
+    'shard_file_name', 'generate_sharded', 'generate_incremental',
+    # Unit helpers from label_layout, still importable from here as before the split
+    'mm_to_points', 'points_to_mm',
+]
+
+# QR encoding parameters used for every label
+QR_ERROR_CORRECTION = qrcode.constants.ERROR_CORRECT_M  # Medium error correction
+QR_BOX_SIZE = 8  # Pixels per module in raster mode
+QR_BORDER = 4  # Quiet zone in modules
+QR_CACHE_SIZE = 4096  # Unique payloads kept encoded between labels and jobs
+QR_CHUNK_SIZE = 256  # Payloads sent to a worker process at a time
+
+SHEET_FORM_NAME = 'SheetTemplate'  # Form XObject with the content shared by every sheet
+HEADER_LOGO_MAX_HEIGHT_MM = 10
+# Canvas method that draws a line of text for each justification
+TEXT_DRAW_METHODS = {'Left': 'drawString', 'Center': 'drawCentredString', 'Right': 'drawRightString'}
+
+# Encoded module matrices, least recently used first, shared by all jobs in
+# this process. Keyed by (payload, error_correction, box_size, border).
+_qr_cache = OrderedDict()
+_qr_cache_lock = threading.Lock()
+_qr_cache_counts = {'hits': 0, 'misses': 0}
+
+def _encode_qr_uncached(payloads, error_correction, box_size, border, fast):
+    if fast and qr_encoder.AVAILABLE:
+        return qr_encoder.encode_matrices(payloads, error_correction, border)
+    matrices = []
+    for payload in payloads:
+        qr = qrcode.QRCode(
+            version=None,  # Let qrcode determine the smallest version possible
+            error_correction=error_correction,
+            box_size=box_size,
+            border=border,
+        )
+        qr.add_data(payload)
+        qr.make(fit=True)
+        matrices.append(tuple(tuple(row) for row in qr.get_matrix()))
+    return matrices
+
+def encode_qr_matrices(payloads, error_correction, box_size, border, fast=True):
+    # Module matrices (border included) for payloads, in order. Each payload
+    # is encoded once and kept in the cache between labels and jobs; the ones
+    # not cached yet are encoded together, in NumPy batches when fast is set
+    # and NumPy is installed (same matrices as qrcode, see qr_encoder).
+    matrices = {}
+    with _qr_cache_lock:
+        for payload in payloads:
+            key = (payload, error_correction, box_size, border)
+            if key in _qr_cache:
+                _qr_cache.move_to_end(key)
+                matrices[payload] = _qr_cache[key]
+                _qr_cache_counts['hits'] += 1
+            elif payload in matrices:
+                _qr_cache_counts['hits'] += 1
+            else:
+                matrices[payload] = None
+                _qr_cache_counts['misses'] += 1
+
+    missing = [payload for payload, matrix in matrices.items() if matrix is None]
+    if missing:
+        encoded = _encode_qr_uncached(missing, error_correction, box_size, border, fast)
+        with _qr_cache_lock:
+            for payload, matrix in zip(missing, encoded):
+                matrices[payload] = matrix
+                _qr_cache[(payload, error_correction, box_size, border)] = matrix
+            while len(_qr_cache) > QR_CACHE_SIZE:
+                _qr_cache.popitem(last=False)
+    return [matrices[payload] for payload in payloads]
+
+def encode_qr_matrix(payload, error_correction, box_size, border):
+    # Encode a payload once and keep its module matrix (border included)
+    return encode_qr_matrices([payload], error_correction, box_size, border)[0]
+
+def qr_matrix_to_image(matrix, box_size):
+    # 1-bit PIL image for raster mode, built from an already encoded module matrix
+    module_count = len(matrix)
+    img = Image.new('1', (module_count, module_count), 1)
+    img.putdata([0 if dark else 1 for row in matrix for dark in row])
+    return img.resize((module_count * box_size, module_count * box_size), Image.NEAREST)
+
+def image_to_png(img):
+    img_buffer = io.BytesIO()
+    img.save(img_buffer, format='PNG')
+    return img_buffer.getvalue()
+
+def qr_cache_stats():
+    # Cumulative (hits, misses) of the QR matrix cache for this process
+    return _qr_cache_counts['hits'], _qr_cache_counts['misses']
+
+def encode_qr_chunk(payloads, error_correction, box_size, border, fast=True):
+    # Encode a chunk in order (None for blank payloads) and report this
+    # chunk's cache hits/misses and encoding time; also the worker entry
+    # point, where these have to be sent back to the parent process
+    start = time.perf_counter()
+    hits_before, misses_before = qr_cache_stats()
+    encoded = iter(encode_qr_matrices([payload for payload in payloads if payload.strip()],
+                                      error_correction, box_size, border, fast))
+    matrices = [next(encoded) if payload.strip() else None for payload in payloads]
+    hits, misses = qr_cache_stats()
+    return matrices, hits - hits_before, misses - misses_before, time.perf_counter() - start
+
+def iter_qr_matrices(payloads, workers=1, chunk_size=QR_CHUNK_SIZE, stats=None, timer=NULL_TIMER, fast=True):
+    # Yield (payload, module matrix) pairs in input order, with None as the
+    # matrix for blank payloads. payloads can be any iterable and is only read
+    # ahead by a bounded amount: it is encoded a chunk at a time. With
+    # workers > 1 the chunks are fanned out to a process pool, and later
+    # chunks keep encoding while the caller draws earlier ones. Cache
+    # hits/misses are added to stats. Each chunk's encoding time, measured
+    # where it ran, is recorded as 'qr_matrix' spread evenly over its labels,
+    # so serial and pooled runs are comparable; time spent waiting for the
+    # pool is recorded separately as 'qr_wait'.
+    if stats is None:
+        stats = {'hits': 0, 'misses': 0}
+
+    payload_iter = iter(payloads)
+    chunks = iter(lambda: list(itertools.islice(payload_iter, chunk_size)), [])
+
+    if workers <= 1:
+        for chunk in chunks:
+            matrices, hits, misses, seconds = encode_qr_chunk(chunk, QR_ERROR_CORRECTION, QR_BOX_SIZE, QR_BORDER,
+                                                              fast)
+            timer.record('qr_matrix', seconds / len(chunk), len(chunk))
+            stats['hits'] += hits
+            stats['misses'] += misses
+            yield from zip(chunk, matrices)
+        return
+
+    executor = ProcessPoolExecutor(max_workers=workers)
+
+    def submit(chunk):
+        return chunk, executor.submit(encode_qr_chunk, chunk, QR_ERROR_CORRECTION, QR_BOX_SIZE, QR_BORDER, fast)
+
+    try:
+        # Keep a bounded number of chunks in flight so memory stays small
+        pending = deque(submit(chunk) for chunk in itertools.islice(chunks, workers * 2))
+        while pending:
+            chunk, future = pending.popleft()
+            waited = time.perf_counter()
+            matrices, hits, misses, seconds = future.result()
+            timer.record('qr_wait', (time.perf_counter() - waited) / len(chunk), len(chunk))
+            timer.record('qr_matrix', seconds / len(chunk), len(chunk))
+            next_chunk = next(chunks, None)
+            if next_chunk is not None:
+                pending.append(submit(next_chunk))
+            stats['hits'] += hits
+            stats['misses'] += misses
+            yield from zip(chunk, matrices)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+def qr_form_name(payload, error_correction, box_size, border, qr_mode):
+    # Stable per-document XObject name for one unique code
+    key = f"{qr_mode}|{error_correction}|{box_size}|{border}|{payload}"
+    return 'QR' + hashlib.sha1(key.encode('utf-8')).hexdigest()[:20]
+
+def draw_qr_form(c, part, matrix, qr_mode, x, y, size, defined_forms, timer=NULL_TIMER):
+    # Write each unique code into the PDF once as a form XObject, then
+    # reference it (scaled from module units) from every label that uses it
+    module_count = len(matrix)
+    name = qr_form_name(part, QR_ERROR_CORRECTION, QR_BOX_SIZE, QR_BORDER, qr_mode)
+    if name not in defined_forms:
+        if qr_mode != 'Vector':
+            with timer.stage('qr_image'):
+                img = qr_matrix_to_image(matrix, QR_BOX_SIZE)
+            with timer.stage('qr_png'):
+                png = image_to_png(img)
+        with timer.stage('qr_draw'):
+            c.beginForm(name, 0, 0, module_count, module_count)
+            if qr_mode == 'Vector':
+                draw_qr_vector(c, matrix, 0, 0, module_count)
+            else:
+                c.drawImage(ImageReader(io.BytesIO(png)), 0, 0, width=module_count, height=module_count)
+            c.endForm()
+        defined_forms.add(name)
+    with timer.stage('qr_draw'):
+        c.saveState()
+        c.translate(x, y)
+        c.scale(size / module_count, size / module_count)
+        c.doForm(name)
+        c.restoreState()
+
+def qr_bitmap_xobject(name, matrix, border):
+    # Image XObject holding one pixel per module as 1-bit DeviceGray with
+    # Flate compression and no quiet zone (the label's white space serves
+    # as the quiet zone instead)
+    core = [row[border:len(row) - border] for row in matrix[border:len(matrix) - border]]
+    module_count = len(core)
+    img = Image.new('1', (module_count, module_count), 1)
+    img.putdata([0 if dark else 1 for row in core for dark in row])
+    xobject = pdfdoc.PDFImageXObject(name)
+    xobject.width = xobject.height = module_count
+    xobject.bitsPerComponent = 1
+    xobject.colorSpace = 'DeviceGray'
+    xobject._filters = ('FlateDecode',)
+    xobject.streamContent = zlib.compress(img.tobytes(), 9)  # rows packed MSB first, 1 = white
+    return xobject
+
+def draw_qr_bitmap(c, part, matrix, x, y, size, defined_forms, timer=NULL_TIMER):
+    # Register each unique code once as a compact image XObject and draw it
+    # inside the quiet zone of the QR area
+    module_count = len(matrix)
+    name = qr_form_name(part, QR_ERROR_CORRECTION, QR_BOX_SIZE, QR_BORDER, 'Bitmap')
+    if name not in defined_forms:
+        with timer.stage('qr_image'):
+            xobject = qr_bitmap_xobject(name, matrix, QR_BORDER)
+        with timer.stage('qr_draw'):
+            c._doc.addForm(name, xobject)
+        defined_forms.add(name)
+    with timer.stage('qr_draw'):
+        module_size = size / module_count
+        c.saveState()
+        c.translate(x + QR_BORDER * module_size, y + QR_BORDER * module_size)
+        c.scale(size - 2 * QR_BORDER * module_size, size - 2 * QR_BORDER * module_size)
+        c.doForm(name)
+        c.restoreState()
+
+def draw_qr_vector(c, matrix, x, y, size):
+    # Draw the QR module matrix as filled vector rectangles, merging
+    # horizontal runs of dark modules so each row costs one rect per run
+    module_count = len(matrix)
+    module_size = size / module_count
+    path = c.beginPath()
+    for row_index, row in enumerate(matrix):
+        # PDF origin is bottom-left, matrix row 0 is the top of the code
+        row_y = y + size - (row_index + 1) * module_size
+        run_start = None
+        for col_index, dark in enumerate(row):
+            if dark and run_start is None:
+                run_start = col_index
+            elif not dark and run_start is not None:
+                path.rect(x + run_start * module_size, row_y,
+                          (col_index - run_start) * module_size, module_size)
+                run_start = None
+        if run_start is not None:
+            path.rect(x + run_start * module_size, row_y,
+                      (module_count - run_start) * module_size, module_size)
+    c.setFillColor("black")
+    c.drawPath(path, stroke=0, fill=1)
+
+def place_label_text(part, slot, layout, settings, font_name, timer=NULL_TIMER):
+    # Font size and (x, y, line) baseline anchors of one label's text, with x
+    # at the justification anchor; shared by the PDF and raster backends
+    font_size = settings.font_size
+    # Dynamic text size: shrink and/or wrap the full text to fit
+    if settings.dynamic_text_size:
+        with timer.stage('text_measure'):
+            current_font_size, lines = fit_text(part, font_name, font_size, layout.text_width,
+                                                layout.label_height - 2 * layout.padding, settings.max_text_lines)
+    else:
+        current_font_size, lines = font_size, (part[:40],)  # Ensure max 40 characters
+
+    if len(lines) > 1:
+        # Centre the block of lines vertically on the label
+        line_height = current_font_size * LINE_SPACING
+        text_y = slot.middle_y + (len(lines) - 1) * line_height / 2 - current_font_size / 2
+    else:
+        line_height = 0
+        text_y = slot.middle_y - font_size / 2
+
+    placements = []
+    for line in lines:
+        placements.append((slot.text_x, text_y, line))
+        text_y -= line_height
+    return current_font_size, placements
+
+def resolve_color(value):
+    # reportlab colour for a name or hex string; black if it is invalid
+    try:
+        return toColor(value)
+    except:
+        return black
+
+def sheet_has_static_content(settings):
+    return bool(settings.draw_rectangles or settings.header_text or settings.logo_file)
+
+def define_sheet_form(c, layout, settings, text_color):
+    # Write everything that is identical on every sheet (debug outlines,
+    # header logo and text) once per document as a form XObject; each page
+    # then references it with doForm(SHEET_FORM_NAME)
+    c.beginForm(SHEET_FORM_NAME, 0, 0, layout.page_width, layout.page_height)
+    if settings.draw_rectangles:
+        for slot in layout.slots:
+            c.roundRect(slot.x, slot.y, layout.label_width, layout.label_height, radius=5, stroke=1, fill=0)
+
+    # The header sits in the band above the first row of labels
+    band_middle = layout.page_height - layout.header_height / 2
+    logo_height = min(layout.header_height - 2 * layout.padding, mm_to_points(HEADER_LOGO_MAX_HEIGHT_MM))
+    if settings.logo_file and logo_height > 0:
+        logo = ImageReader(settings.logo_file)
+        image_width, image_height = logo.getSize()
+        logo_width = logo_height * image_width / image_height
+        c.drawImage(logo, layout.slots[0].x, band_middle - logo_height / 2, width=logo_width, height=logo_height,
+                    mask='auto')
+    if settings.header_text:
+        c.setFont(settings.font_name, settings.font_size)
+        c.setFillColor(text_color)
+        c.drawCentredString(layout.page_width / 2, band_middle - settings.font_size / 3, settings.header_text)
+    c.endForm()
+
+@dataclass
+class LabelSettings:
+    # Page layout (mm); defaults match Avery 5167
+    left_margin: float = 4.05
+    top_margin: float = 12.837
+    label_width: float = 44.24
+    label_height: float = 12.47
+    x_pitch: float = 51.95
+    y_pitch: float = 12.6863
+    labels_x: int = 4
+    labels_y: int = 20
+    center_horizontally: bool = True
+    center_vertically: bool = True
+    start_index: int = 0
+    draw_rectangles: bool = False
+
+    # Label content
+    enable_qr: bool = True
+    qr_mode: str = 'Vector'  # 'Vector', 'Raster' or 'Bitmap' (compact 1-bit images)
+    qr_workers: int = 1
+    fast_qr: bool = True  # Batch QR encoding with NumPy when it is installed
+    flush_sheets: int = 0  # Write the PDF in segments of this many sheets (0 = one document)
+    shard_sheets: int = 0  # Render shards of this many sheets in parallel processes (0 = off)
+    shard_workers: int = 0  # Processes for sharded rendering (0 = one per CPU)
+    keep_shards: bool = False  # Keep numbered shard PDFs instead of joining them
+    job_cache_dir: str = ''  # Reuse unchanged sheets rendered into this directory (empty = off)
+    delta_output: str = ''  # With a job cache, also write the sheets changed since the last run here
+    dynamic_text_size: bool = False  # Shrink (and wrap) text to fit the label
+    max_text_lines: int = 2  # Lines dynamic text size may wrap long part numbers onto
+    font_size: int = 12
+    font_family: str = 'Helvetica'
+    font_bold: bool = False
+    font_italic: bool = False
+    font_color: str = 'black'
+    text_justification: str = 'Left'  # 'Left', 'Center' or 'Right'
+
+    # Sheet content drawn once per document and repeated on every page
+    header_text: str = ''  # Centred in the band above the first row
+    logo_file: str = ''  # Image drawn at the left of that band
+
+    @classmethod
+    def from_dict(cls, values):
+        # Build settings from loosely typed values (e.g. Tk StringVar text),
+        # converting each known key to its field type and ignoring the rest
+        kwargs = {}
+        for f in fields(cls):
+            if f.name not in values:
+                continue
+            value = values[f.name]
+            if f.type is bool and isinstance(value, str):
+                value = value.strip().lower() in ('1', 'true', 'yes', 'on')
+            elif f.type is int:
+                value = int(float(value))
+            elif f.type is float:
+                value = float(value)
+            kwargs[f.name] = value
+        return cls(**kwargs)
+
+    @property
+    def labels_per_sheet(self):
+        return self.labels_x * self.labels_y
+
+    @property
+    def font_name(self):
+        # reportlab name for the font family and style; TrueType families are
+        # registered on first use. Raises ValueError for unknown families.
+        return font_registry.font_name(self.font_family, self.font_bold, self.font_italic)
+
+    def validate(self, fonts=True):
+        # Raises ValueError for invalid settings. fonts=False skips resolving
+        # the font family, which may scan the font directories and parse a
+        # font file, for callers on a UI thread; generation validates fully.
+        if self.labels_x < 1 or self.labels_y < 1:
+            raise ValueError("Labels in X and Y must be at least 1.")
+        if self.start_index < 0 or self.start_index >= self.labels_per_sheet:
+            raise ValueError(f"Label Start Index must be between 0 and {self.labels_per_sheet - 1}.")
+        if self.flush_sheets < 0:
+            raise ValueError("Flush sheets must be 0 or more.")
+        if self.max_text_lines < 1:
+            raise ValueError("Max text lines must be at least 1.")
+        if self.shard_sheets < 0 or self.shard_workers < 0:
+            raise ValueError("Shard sheets and shard workers must be 0 or more.")
+        if self.qr_mode not in ('Vector', 'Raster', 'Bitmap'):
+            raise ValueError(f"Unknown QR rendering mode: {self.qr_mode!r}")
+        if self.text_justification not in ('Left', 'Center', 'Right'):
+            raise ValueError(f"Unknown text justification: {self.text_justification!r}")
+        if self.logo_file and not os.path.isfile(self.logo_file):
+            raise ValueError(f"Logo file not found: {self.logo_file}")
+        if fonts:
+            font_registry.font_name(self.font_family, self.font_bold, self.font_italic)  # Unknown families raise
+        if self.delta_output and not self.job_cache_dir:
+            raise ValueError("A delta output needs a job cache directory.")
+
+class GenerationCancelled(Exception):
+    pass
+
+@dataclass
+class GenerationResult:
+    output_file: str
+    sheet_count: int
+    label_count: int
+    unique_codes: int = 0
+    qr_cache_hits: int = 0
+    qr_cache_misses: int = 0
+    timings: Dict[str, float] = field(default_factory=dict)  # seconds per phase
+    shard_files: List[str] = field(default_factory=list)  # Kept shard PDFs, in page order
+    stages: Dict[str, Dict] = field(default_factory=dict)  # StageTimer.report() when instrumented
+    pdf_bytes: int = 0  # Size of the written PDF(s)
+    reused_sheets: int = 0  # Sheets taken from the job cache
+    changed_sheets: List[int] = field(default_factory=list)  # Sheet numbers changed since the last run
+    delta_file: str = ''  # PDF holding just the changed sheets, when written
+
+    @property
+    def bytes_per_label(self):
+        return self.pdf_bytes / self.label_count if self.label_count else 0
+
+    def summary(self):
+        return (
+            f"PDF generated successfully at:\n{self.output_file}\nNumber of sheets required: {self.sheet_count}"
+            f"\nQR cache: {self.qr_cache_hits} hits, {self.qr_cache_misses} misses ({self.unique_codes} unique codes)"
+            f"\nOutput size: {self.pdf_bytes} bytes ({self.bytes_per_label:.0f} bytes per label)"
+            + (f"\nSheets reused from cache: {self.reused_sheets}, changed since last run: {len(self.changed_sheets)}"
+               if self.reused_sheets or self.changed_sheets else '')
+            + (f"\nChanged sheets written to:\n{self.delta_file}" if self.delta_file else '')
+        )
+
+@contextmanager
+def binary_streams(enabled):
+    # Write Flate streams as raw binary instead of ASCII85-wrapped text, which
+    # is about 25% smaller. reportlab only exposes this as a global setting,
+    # so it is switched for the duration of the block.
+    if not enabled:
+        yield
+        return
+    previous = rl_config.useA85
+    rl_config.useA85 = 0
+    try:
+        yield
+    finally:
+        rl_config.useA85 = previous
+
+def generate_pdf(part_numbers: Iterable[str], output_file: str, settings: LabelSettings,
+                 progress: Optional[Callable[[int, int], None]] = None,
+                 cancel_event: Optional[threading.Event] = None,
+                 timer: Optional[StageTimer] = None) -> GenerationResult:
+    # Render part_numbers onto label sheets and save them to output_file.
+    # part_numbers can be any iterable (e.g. a generator over a CSV export);
+    # it is consumed one sheet at a time and never materialized as a list.
+    # With settings.flush_sheets > 0 the document is written in segments of
+    # that many sheets and joined at the end, so memory stays flat regardless
+    # of job size. With settings.shard_sheets > 0 the job is split into shards
+    # rendered by separate processes (see generate_sharded). With
+    # settings.job_cache_dir set only sheets missing from that cache are
+    # rendered (see generate_incremental).
+    # progress(labels_done, sheets_done) is called after every sheet. Setting
+    # cancel_event stops the job at the next sheet, removes any partial output
+    # and raises GenerationCancelled. Pass a StageTimer as timer to collect
+    # per-stage timings (reported in GenerationResult.stages).
+    # Raises ValueError for invalid settings.
+    settings.validate()
+    if settings.job_cache_dir:
+        return generate_incremental(part_numbers, output_file, settings, progress, cancel_event, timer)
+    if settings.shard_sheets > 0:
+        return generate_sharded(part_numbers, output_file, settings, progress, cancel_event, timer)
+    start_time = time.perf_counter()
+    if timer is None:
+        timer = NULL_TIMER
+    # Compact output also drops the ASCII85 wrapping of compressed streams
+    compact_streams = settings.qr_mode == 'Bitmap'
+    # Slot positions are computed once; only the text size varies per label
+    layout = SheetLayout.from_settings(settings)
+    labels_per_sheet = settings.labels_per_sheet
+    font_name = settings.font_name
+    draw_text = TEXT_DRAW_METHODS[settings.text_justification]
+    has_sheet_form = sheet_has_static_content(settings)
+    text_color = resolve_color(settings.font_color)
+
+    # Pair every part number with its QR matrix (None when QR is disabled)
+    qr_stats = {'hits': 0, 'misses': 0}
+    if settings.enable_qr:
+        labels = iter_qr_matrices(part_numbers, settings.qr_workers, stats=qr_stats, timer=timer,
+                                  fast=settings.fast_qr)
+    else:
+        labels = ((part, None) for part in part_numbers)
+
+    segment_files = []
+    c = None
+    unique_codes = 0
+    sheet_count = 0
+    label_count = 0
+
+    try:
+        while True:
+            if cancel_event is not None and cancel_event.is_set():
+                raise GenerationCancelled()
+
+            # Pull one sheet's worth of labels; the first sheet skips start_index slots
+            first_slot = settings.start_index if sheet_count == 0 else 0
+            sheet = list(itertools.islice(labels, labels_per_sheet - first_slot))
+            if not sheet and sheet_count > 0:
+                break  # Input ended exactly on a sheet boundary
+
+            if c is None:
+                # Start a new document (or a new segment of a flushed one)
+                if settings.flush_sheets > 0:
+                    fd, path = tempfile.mkstemp(suffix='.pdf', prefix='segment-',
+                                                dir=os.path.dirname(os.path.abspath(output_file)))
+                    os.close(fd)
+                    segment_files.append(path)
+                else:
+                    path = output_file
+                c = canvas.Canvas(path, pagesize=letter, pageCompression=1)
+                # QR form XObjects already written into this document
+                defined_forms = set()
+                if has_sheet_form:
+                    define_sheet_form(c, layout, settings, text_color)
+            else:
+                c.showPage()
+
+            # Page state: the static sheet content, then the text colour and
+            # font, which are only changed again when the font size changes
+            if has_sheet_form:
+                c.doForm(SHEET_FORM_NAME)
+            c.setFillColor(text_color)
+            page_font_size = None
+            draw_line = getattr(c, draw_text)
+
+            for slot, (part, matrix) in zip(layout.slots[first_slot:], sheet):
+                if part.strip() == '':
+                    continue
+
+                if settings.enable_qr:
+                    if settings.qr_mode == 'Bitmap':
+                        draw_qr_bitmap(c, part, matrix, slot.qr_x, slot.qr_y, layout.qr_size, defined_forms, timer)
+                    else:
+                        draw_qr_form(c, part, matrix, settings.qr_mode, slot.qr_x, slot.qr_y, layout.qr_size,
+                                     defined_forms, timer)
+
+                current_font_size, placements = place_label_text(part, slot, layout, settings, font_name, timer)
+                with timer.stage('text_draw'):
+                    if current_font_size != page_font_size:
+                        c.setFont(font_name, current_font_size)
+                        page_font_size = current_font_size
+                    for x, y, line in placements:
+                        draw_line(x, y, line)
+
+            sheet_count += 1
+            label_count += len(sheet)
+            if progress is not None:
+                progress(label_count, sheet_count)
+
+            if settings.flush_sheets > 0 and sheet_count % settings.flush_sheets == 0:
+                # Segment complete: write it out and release its pages
+                with timer.stage('save'), binary_streams(compact_streams):
+                    c.save()
+                unique_codes += len(defined_forms)
+                c = None
+
+            if len(sheet) < labels_per_sheet - first_slot:
+                break  # Input exhausted part way through this sheet
+
+        render_done = time.perf_counter()
+        with timer.stage('save'):
+            if c is not None:
+                with binary_streams(compact_streams):
+                    c.save()
+                unique_codes += len(defined_forms)
+            if segment_files:
+                try:
+                    merge_pdfs(segment_files, output_file)
+                except BaseException:
+                    _remove_files([output_file])
+                    raise
+        save_done = time.perf_counter()
+    finally:
+        if settings.enable_qr:
+            labels.close()
+        # Unsaved canvases never touch the disk; only segments need cleaning up
+        _remove_files(segment_files)
+
+    return GenerationResult(
+        output_file=output_file,
+        sheet_count=sheet_count,
+        label_count=label_count,
+        unique_codes=unique_codes,
+        qr_cache_hits=qr_stats['hits'],
+        qr_cache_misses=qr_stats['misses'],
+        timings={
+            'render': render_done - start_time,
+            'save': save_done - render_done,
+            'total': save_done - start_time,
+        },
+        stages=timer.report(),
+        pdf_bytes=os.path.getsize(output_file),
+    )
+
+def iter_shards(part_numbers, settings):
+    # Split the label stream along sheet boundaries into lists of
+    # settings.shard_sheets sheets each. Yields (parts, start_index) where
+    # start_index only applies to the first shard's first sheet.
+    labels = iter(part_numbers)
+    start_index = settings.start_index
+    first_shard = True
+    while True:
+        capacity = settings.shard_sheets * settings.labels_per_sheet - start_index
+        parts = list(itertools.islice(labels, capacity))
+        if parts or first_shard:
+            # The first shard is always produced so empty input gives a blank sheet
+            yield parts, start_index
+        if len(parts) < capacity:
+            return
+        start_index = 0
+        first_shard = False
+
+def shard_file_name(output_file, shard_number):
+    # labels.pdf -> labels-0001.pdf
+    root, ext = os.path.splitext(output_file)
+    return f"{root}-{shard_number:04d}{ext or '.pdf'}"
+
+def generate_sharded(part_numbers: Iterable[str], output_file: str, settings: LabelSettings,
+                     progress: Optional[Callable[[int, int], None]] = None,
+                     cancel_event: Optional[threading.Event] = None,
+                     timer: Optional[StageTimer] = None) -> GenerationResult:
+    # Render the job as independent page-range PDFs in a process pool. The
+    # shards are numbered after output_file; unless settings.keep_shards is
+    # set they are joined into output_file afterwards and removed. progress
+    # and cancel_event work as in generate_pdf, at shard granularity; shard
+    # stage timings are merged into timer.
+    start_time = time.perf_counter()
+    workers = settings.shard_workers or os.cpu_count() or 1
+    shard_settings = replace(settings, shard_sheets=0, qr_workers=1)
+
+    result = GenerationResult(output_file=output_file, sheet_count=0, label_count=0)
+    shard_files = []
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        # Keep a bounded number of shards in flight so input is read lazily
+        pending = deque()
+
+        def collect():
+            shard_result = pending.popleft().result()
+            _add_shard_result(result, shard_result)
+            if timer is not None:
+                timer.merge(shard_result.stages)
+            if progress is not None:
+                progress(result.label_count, result.sheet_count)
+            if cancel_event is not None and cancel_event.is_set():
+                raise GenerationCancelled()
+
+        for parts, start_index in iter_shards(part_numbers, settings):
+            shard_file = shard_file_name(output_file, len(shard_files) + 1)
+            shard_files.append(shard_file)
+            pending.append(executor.submit(
+                generate_pdf, parts, shard_file, replace(shard_settings, start_index=start_index),
+                timer=StageTimer() if timer is not None else None))
+            while len(pending) >= workers * 2 or (pending and pending[0].done()):
+                collect()
+        while pending:
+            collect()
+    except BaseException:
+        executor.shutdown(wait=True, cancel_futures=True)
+        _remove_files(shard_files)
+        raise
+    executor.shutdown(wait=True)
+    render_done = time.perf_counter()
+
+    if settings.keep_shards:
+        result.shard_files = shard_files
+    else:
+        try:
+            merge_pdfs(shard_files, output_file)
+        except BaseException:
+            _remove_files([output_file])
+            raise
+        finally:
+            _remove_files(shard_files)
+    save_done = time.perf_counter()
+
+    result.timings = {
+        'render': render_done - start_time,
+        'save': save_done - render_done,
+        'total': save_done - start_time,
+    }
+    if timer is not None:
+        result.stages = timer.report()
+    result.pdf_bytes = sum(os.path.getsize(path) for path in (result.shard_files or [output_file]))
+    return result
+
+def generate_incremental(part_numbers: Iterable[str], output_file: str, settings: LabelSettings,
+                         progress: Optional[Callable[[int, int], None]] = None,
+                         cancel_event: Optional[threading.Event] = None,
+                         timer: Optional[StageTimer] = None) -> GenerationResult:
+    # Render the job sheet by sheet through the job cache in
+    # settings.job_cache_dir: a sheet whose labels, first slot and rendering
+    # settings match a cached one is reused, any other sheet is rendered and
+    # cached, and output_file is joined from the sheet PDFs. Sheets that differ
+    # from the last run writing output_file are listed in changed_sheets and,
+    # with settings.delta_output, joined into that file for reprinting.
+    # progress and cancel_event work as in generate_pdf. Sharding and flushing
+    # do not apply since every sheet is already its own document.
+    start_time = time.perf_counter()
+    cache = JobCache(settings.job_cache_dir)
+    fingerprint = cache.settings_fingerprint(settings)
+    sheet_settings = replace(settings, job_cache_dir='', delta_output='', flush_sheets=0, shard_sheets=0)
+    previous_keys = cache.load_manifest(output_file)
+
+    result = GenerationResult(output_file=output_file, sheet_count=0, label_count=0)
+    keys = []
+    sheet_files = []
+    changed_files = []
+    for parts, start_index in iter_shards(part_numbers, replace(settings, shard_sheets=1)):
+        key = cache.sheet_key(fingerprint, start_index, parts)
+        sheet_file = cache.lookup(key)
+        if sheet_file is None:
+            rendered_file = cache.sheet_path(key) + f'.{os.getpid()}.tmp'
+            os.makedirs(os.path.dirname(rendered_file), exist_ok=True)
+            try:
+                sheet_result = generate_pdf(parts, rendered_file, replace(sheet_settings, start_index=start_index),
+                                            timer=timer)
+                sheet_file = cache.store(key, rendered_file)
+            except BaseException:
+                _remove_files([rendered_file])
+                raise
+            _add_shard_result(result, sheet_result)
+        else:
+            result.reused_sheets += 1
+            result.sheet_count += 1
+            result.label_count += len(parts)
+        if len(keys) >= len(previous_keys) or previous_keys[len(keys)] != key:
+            result.changed_sheets.append(len(keys) + 1)
+            changed_files.append(sheet_file)
+        keys.append(key)
+        sheet_files.append(sheet_file)
+        if progress is not None:
+            progress(result.label_count, result.sheet_count)
+        if cancel_event is not None and cancel_event.is_set():
+            raise GenerationCancelled()
+    render_done = time.perf_counter()
+
+    try:
+        merge_pdfs(sheet_files, output_file)
+        if settings.delta_output:
+            # An old delta would reprint sheets that are no longer changed
+            _remove_files([settings.delta_output])
+            if changed_files:
+                merge_pdfs(changed_files, settings.delta_output)
+                result.delta_file = settings.delta_output
+    except BaseException:
+        _remove_files([output_file, settings.delta_output])
+        raise
+    cache.save_manifest(output_file, keys)
+    if result.sheet_count > result.reused_sheets:
+        cache.prune()
+    save_done = time.perf_counter()
+
+    result.timings = {
+        'render': render_done - start_time,
+        'save': save_done - render_done,
+        'total': save_done - start_time,
+    }
+    if timer is not None:
+        result.stages = timer.report()
+    result.pdf_bytes = os.path.getsize(output_file)
+    return result
+
+def _add_shard_result(result, shard_result):
+    result.sheet_count += shard_result.sheet_count
+    result.label_count += shard_result.label_count
+    result.unique_codes += shard_result.unique_codes
+    result.qr_cache_hits += shard_result.qr_cache_hits
+    result.qr_cache_misses += shard_result.qr_cache_misses
+
+def _remove_files(paths):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
@@ -0,0 +1,91 @@
+"""Sheet geometry shared by the PDF renderer and the GUI preview.
+
+A SheetLayout is worked out once per job from the template settings: the
+page position of every label slot, where its QR code and text go, and the
+free band above the first row. Rendering then only looks slots up instead
+of recomputing positions for every label on every sheet.
+"""
+from dataclasses import dataclass
+from typing import NamedTuple, Tuple
+
+from reportlab.lib.pagesizes import letter
+
+PAGE_SIZE = letter  # (width, height) in points
+LABEL_PADDING_MM = 1  # Space between the label edge and its content
+QR_TEXT_GAP_MM = 1  # Space between the QR code and the text
+
+# Helper functions for unit conversion
+def mm_to_points(mm_value):
+    return mm_value * 72 / 25.4
+
+def points_to_mm(points_value):
+    return points_value * 25.4 / 72
+
+class Slot(NamedTuple):
+    # One label position on the page, in points from the bottom-left corner
+    x: float  # Label corner
+    y: float
+    qr_x: float  # QR code corner
+    qr_y: float
+    text_x: float  # Text anchor for the chosen justification
+    middle_y: float  # Vertical centre of the label
+
+@dataclass(frozen=True)
+class SheetLayout:
+    page_width: float
+    page_height: float
+    label_width: float
+    label_height: float
+    padding: float
+    qr_size: float  # Side of the QR code (0 when QR codes are disabled)
+    text_width: float  # Width available to the text
+    header_height: float  # Free band between the page top and the first row
+    slots: Tuple[Slot, ...]  # In fill order: left to right, top to bottom
+
+    @classmethod
+    def plan(cls, left_margin, top_margin, label_width, label_height, x_pitch, y_pitch, labels_x, labels_y,
+             center_horizontally=True, center_vertically=True, enable_qr=True, text_justification='Left',
+             page_size=PAGE_SIZE):
+        # Build the slot table from template measurements in mm
+        page_width, page_height = page_size
+        left_margin = mm_to_points(left_margin)
+        top_margin = mm_to_points(top_margin)
+        label_width = mm_to_points(label_width)
+        label_height = mm_to_points(label_height)
+        x_pitch = mm_to_points(x_pitch)
+        y_pitch = mm_to_points(y_pitch)
+
+        # Adjust margins for centering
+        if center_horizontally:
+            left_margin = (page_width - ((labels_x - 1) * x_pitch + label_width)) / 2
+        if center_vertically:
+            top_margin = (page_height - ((labels_y - 1) * y_pitch + label_height)) / 2
+
+        padding = mm_to_points(LABEL_PADDING_MM)
+        qr_size = label_height - 2 * padding if enable_qr else 0
+        text_offset = padding + (qr_size + mm_to_points(QR_TEXT_GAP_MM) if enable_qr else 0)
+        text_width = label_width - padding - text_offset
+
+        slots = []
+        for row in range(labels_y):
+            y = page_height - (top_margin + row * y_pitch + label_height)
+            for col in range(labels_x):
+                x = left_margin + col * x_pitch
+                if text_justification == 'Center':
+                    text_x = x + label_width / 2
+                elif text_justification == 'Right':
+                    text_x = x + label_width - padding
+                else:
+                    text_x = x + text_offset
+                slots.append(Slot(x, y, x + padding, y + padding, text_x, y + label_height / 2))
+
+        return cls(page_width, page_height, label_width, label_height, padding, qr_size, text_width,
+                   top_margin, tuple(slots))
+
+    @classmethod
+    def from_settings(cls, settings, page_size=PAGE_SIZE):
+        # Layout for a label_core.LabelSettings
+        return cls.plan(settings.left_margin, settings.top_margin, settings.label_width, settings.label_height,
+                        settings.x_pitch, settings.y_pitch, settings.labels_x, settings.labels_y,
+                        settings.center_horizontally, settings.center_vertically, settings.enable_qr,
+                        settings.text_justification, page_size)
@@ -0,0 +1,429 @@
+"""Local label rendering service.
+
+Keeps a pool of warm worker processes (label_core imported, QR encoder
+tables and fonts loaded) so stations can get labels on demand without
+paying start-up costs per job. Each worker keeps its QR and font caches
+between jobs.
+
+    POST /labels        part numbers in, PDF out. Either a JSON body
+                        {"parts": [...], "settings": {...}, "batch": false}
+                        or a plain text body with one part number or
+                        sequence spec per line and settings (and batch=1)
+                        in the query string. The PDF is streamed from disk.
+    GET  /batches       rendered batches waiting in the spool, as JSON
+    GET  /batches/<id>  the PDF of a spooled batch; it leaves the spool
+    GET  /metrics       request, label and byte counters, throughput, queue
+                        depth and histograms of queue wait, render and
+                        stream times, as JSON.
+
+Batched requests that share a template (identical settings) and arrive
+within the batch window are merged into one label stream. The batch is
+rendered once, as soon as it fills a sheet or when the window ends, and
+its PDF goes to the spool for one consumer (e.g. the shared printer) to
+fetch. The batched requests themselves get a JSON receipt with the batch
+id and their label slots rather than the PDF, which also holds other
+requests' labels. Spooled batches not fetched within SPOOL_TTL are dropped.
+
+Examples:
+    python label_server.py --port 8765 --workers 4
+    curl --data-binary @parts.txt 'http://127.0.0.1:8765/labels?font_size=10' -o labels.pdf
+    curl -s http://127.0.0.1:8765/metrics
+"""
+import argparse
+import dataclasses
+import itertools
+import json
+import os
+import shutil
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+import label_core
+from instrumentation import StageTimer
+from label_core import LabelSettings, generate_pdf
+from sequences import count_lines, expand_lines
+
+DEFAULT_PORT = 8765
+BATCH_WINDOW = 0.5  # Seconds a batch waits for more requests before rendering
+SPOOL_TTL = 3600  # Seconds a rendered batch waits in the spool to be fetched
+STREAM_CHUNK = 64 * 1024  # Bytes written to the client at a time
+MAX_REQUEST_BYTES = 64 * 1024 * 1024
+# Settings that would let clients read or write files or start processes on
+# the server
+SERVER_ONLY_FIELDS = frozenset({
+    'logo_file', 'qr_workers', 'flush_sheets', 'shard_sheets', 'shard_workers', 'keep_shards', 'job_cache_dir',
+    'delta_output',
+})
+
+def warm_worker():
+    # Worker initializer: build the encoder tables and register the default
+    # font before the first job arrives
+    label_core.encode_qr_matrices(['WARMUP'], label_core.QR_ERROR_CORRECTION, label_core.QR_BOX_SIZE,
+                                  label_core.QR_BORDER)
+    LabelSettings().validate()
+
+def render_job(lines, output_file, settings):
+    # Runs in a worker: returns (GenerationResult, wall clock start time)
+    started = time.time()
+    return generate_pdf(expand_lines(lines), output_file, settings), started
+
+class Batch:
+    # Requests for one template waiting to be rendered together
+    def __init__(self, batch_id, settings):
+        self.batch_id = batch_id
+        self.settings = settings
+        self.lines = []
+        self.label_count = 0
+        self.requests = 0
+        self.received = []  # Arrival times, for queue wait
+        self.future = Future()  # Set to the render future when the batch is flushed and spooled
+        self.timer = None
+
+class LabelService:
+    def __init__(self, workers=None, batch_window=BATCH_WINDOW, temp_dir=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_window = batch_window
+        self.temp_dir = temp_dir
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=warm_worker)
+        self.lock = threading.Lock()
+        self.batches = {}  # Template key -> open Batch
+        self.batch_ids = itertools.count(1)
+        self.spool = {}  # Batch id -> (GenerationResult, PDF path, time rendered), oldest first
+        self.timer = StageTimer()
+        self.counters = dict.fromkeys(
+            ('requests', 'failed_requests', 'batched_requests', 'batches', 'spooled_batches', 'expired_batches', 'jobs',
+             'labels', 'sheets', 'pdf_bytes', 'qr_cache_hits', 'qr_cache_misses', 'queued'), 0)
+        self.start_time = time.time()
+
+    def warm_up(self):
+        # Start every worker process now rather than on the first requests
+        for future in [self.executor.submit(time.sleep, 0.05) for _ in range(self.workers)]:
+            future.result()
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        with self.lock:
+            spooled, self.spool = self.spool, {}
+        for _, output_file, _ in spooled.values():
+            _remove_file(output_file)
+
+    def count(self, **deltas):
+        with self.lock:
+            for name, delta in deltas.items():
+                self.counters[name] += delta
+
+    def record(self, stage, seconds):
+        # StageTimer is not thread-safe; handler threads and callbacks share it
+        with self.lock:
+            self.timer.record(stage, seconds)
+
+    def _new_file(self):
+        handle, path = tempfile.mkstemp(suffix='.pdf', prefix='labels-', dir=self.temp_dir)
+        os.close(handle)
+        return path
+
+    def _submit(self, lines, settings, received):
+        # Render in a worker; the future's result is (result, output_file)
+        output_file = self._new_file()
+        done = Future()
+        self.count(jobs=1, queued=1)
+
+        def finished(job):
+            self.count(queued=-1)
+            try:
+                result, started = job.result()
+            except BaseException as e:
+                _remove_file(output_file)
+                done.set_exception(e)
+                return
+            for arrival in received:
+                self.record('queue_wait', max(started - arrival, 0))
+            self.record('render', result.timings.get('total', 0))
+            self.count(labels=result.label_count, sheets=result.sheet_count, pdf_bytes=result.pdf_bytes,
+                        qr_cache_hits=result.qr_cache_hits, qr_cache_misses=result.qr_cache_misses)
+            done.set_result((result, output_file))
+
+        self.executor.submit(render_job, lines, output_file, settings).add_done_callback(finished)
+        return done
+
+    def render(self, lines, settings):
+        # Future of (GenerationResult, PDF path) for one request; the caller
+        # removes the file when it has been sent
+        return self._submit(lines, settings, [time.time()])
+
+    def render_batched(self, lines, settings):
+        # Join the open batch for this template. Returns (batch, first slot,
+        # label count); batch.future is done once the batch is rendered and
+        # in the spool (or has failed).
+        key = json.dumps(dataclasses.asdict(settings), sort_keys=True)
+        count = count_lines(lines)
+        with self.lock:
+            batch = self.batches.get(key)
+            if batch is None:
+                batch = self.batches[key] = Batch(next(self.batch_ids), settings)
+                batch.timer = threading.Timer(self.batch_window, self._flush, (key, batch))
+                batch.timer.daemon = True
+                batch.timer.start()
+                self.counters['batches'] += 1
+            first_slot = batch.label_count
+            batch.lines.extend(lines)
+            batch.label_count += count
+            batch.requests += 1
+            batch.received.append(time.time())
+            self.counters['batched_requests'] += 1
+            full = batch.label_count >= settings.labels_per_sheet - settings.start_index
+        if full:
+            self._flush(key, batch)
+        return batch, first_slot, count
+
+    def _flush(self, key, batch):
+        # Render a batch once: when it fills a sheet or its window ends
+        with self.lock:
+            if self.batches.get(key) is not batch:
+                return  # Already flushed
+            del self.batches[key]
+            batch.timer.cancel()
+        render = self._submit(batch.lines, batch.settings, batch.received)
+        render.add_done_callback(lambda job: self._spool(batch, job))
+
+    def _spool(self, batch, job):
+        # Keep a rendered batch until it is fetched, then wake its requests
+        if job.exception() is None:
+            result, output_file = job.result()
+            with self.lock:
+                self.spool[batch.batch_id] = (result, output_file, time.time())
+                self.counters['spooled_batches'] += 1
+            self.expire_spool()
+        _chain(job, batch.future)
+
+    def spooled(self):
+        # Batches waiting to be fetched, oldest first
+        self.expire_spool()
+        with self.lock:
+            return [{'batch_id': batch_id, 'labels': result.label_count, 'sheets': result.sheet_count,
+                     'url': f"/batches/{batch_id}"}
+                    for batch_id, (result, _, _) in self.spool.items()]
+
+    def take_batch(self, batch_id):
+        # (GenerationResult, PDF path) of a spooled batch, removing it from the
+        # spool so only one consumer gets it; None if unknown or already taken.
+        # The caller removes the file once it has been sent.
+        with self.lock:
+            spooled = self.spool.pop(batch_id, None)
+            if spooled is not None:
+                self.counters['spooled_batches'] -= 1
+        return spooled[:2] if spooled is not None else None
+
+    def expire_spool(self, ttl=SPOOL_TTL):
+        # Remove batches nobody fetched within ttl seconds
+        cutoff = time.time() - ttl
+        with self.lock:
+            expired = [batch_id for batch_id, (_, _, rendered) in self.spool.items() if rendered < cutoff]
+            files = [self.spool.pop(batch_id)[1] for batch_id in expired]
+            self.counters['spooled_batches'] -= len(files)
+            self.counters['expired_batches'] += len(files)
+        for output_file in files:
+            _remove_file(output_file)
+
+    def metrics(self):
+        with self.lock:
+            counters = dict(self.counters)
+            counters['queued'] += sum(batch.requests for batch in self.batches.values())
+            stages = self.timer.report()
+        uptime = time.time() - self.start_time
+        return dict(
+            counters,
+            workers=self.workers,
+            uptime_seconds=uptime,
+            labels_per_second=counters['labels'] / uptime if uptime else 0,
+            stages=stages,
+        )
+
+def _chain(source, target):
+    if source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
+
+def _remove_file(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+class LabelRequestHandler(BaseHTTPRequestHandler):
+    server_version = 'LabelServer/1'
+    protocol_version = 'HTTP/1.1'
+
+    def address_string(self):
+        # Unix socket clients have no address
+        return self.client_address[0] if isinstance(self.client_address, tuple) else 'local'
+
+    def do_GET(self):
+        service = self.server.service
+        path = urlsplit(self.path).path
+        if path == '/metrics':
+            self._send_json(200, service.metrics())
+        elif path == '/batches':
+            self._send_json(200, service.spooled())
+        elif path.startswith('/batches/') and path.rpartition('/')[2].isdigit():
+            batch_id = int(path.rpartition('/')[2])
+            spooled = service.take_batch(batch_id)
+            if spooled is None:
+                self.send_error(404, "Batch not found or already fetched")
+                return
+            result, output_file = spooled
+            try:
+                self._send_pdf(output_file, result, {'X-Batch-Id': batch_id})
+            finally:
+                _remove_file(output_file)
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        service = self.server.service
+        url = urlsplit(self.path)
+        if url.path != '/labels':
+            self.send_error(404)
+            return
+        service.count(requests=1)
+        received = time.perf_counter()
+        try:
+            lines, settings, batched = self._read_job(url.query)
+        except (TypeError, ValueError) as e:
+            service.count(failed_requests=1)
+            self.close_connection = True  # The body may not have been read
+            self._send_json(400, {'error': str(e)})
+            return
+
+        try:
+            if batched:
+                # The batch PDF holds other requests' labels too, so it goes to
+                # the spool; this request only gets a receipt
+                batch, first_slot, count = service.render_batched(lines, settings)
+                batch.future.result()
+            else:
+                result, output_file = service.render(lines, settings).result()
+        except ValueError as e:
+            service.count(failed_requests=1)
+            self._send_json(400, {'error': str(e)})
+            return
+        except Exception as e:
+            # Details (file paths, library internals) go to the server log only
+            service.count(failed_requests=1)
+            self.log_error("Rendering failed: %r", e)
+            self._send_json(500, {'error': 'Rendering failed.'})
+            return
+
+        if batched:
+            self._send_json(200, {'batch_id': batch.batch_id, 'label_slots': f"{first_slot + 1}-{first_slot + count}",
+                                  'labels': count, 'url': f"/batches/{batch.batch_id}"})
+        else:
+            try:
+                self._send_pdf(output_file, result, {})
+            finally:
+                _remove_file(output_file)
+        service.record('request', time.perf_counter() - received)
+
+    def _read_job(self, query):
+        # (lines, settings, batched) from a JSON or plain text request
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_REQUEST_BYTES:
+            raise ValueError(f"Request body is larger than {MAX_REQUEST_BYTES} bytes.")
+        body = self.rfile.read(length).decode('utf-8')
+        values = dict(parse_qsl(query))
+        if self.headers.get_content_type() == 'application/json':
+            try:
+                job = json.loads(body or '{}')
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Invalid JSON: {e}") from None
+            if not isinstance(job, dict) or not isinstance(job.get('settings', {}), dict):
+                raise ValueError('Expected {"parts": [...], "settings": {...}}.')
+            parts = job.get('parts', [])
+            # bool is an int subclass but not a part number
+            if not isinstance(parts, list) or not all(
+                    isinstance(part, (str, int)) and not isinstance(part, bool) for part in parts):
+                raise ValueError('"parts" must be a list of strings or integers.')
+            lines = [str(part) for part in parts]
+            values.update(job.get('settings', {}))
+            batched = job.get('batch', values.pop('batch', False))
+        else:
+            lines = body.splitlines()
+            batched = values.pop('batch', False)
+        if isinstance(batched, str):
+            batched = batched.strip().lower() in ('1', 'true', 'yes', 'on')
+
+        refused = SERVER_ONLY_FIELDS.intersection(values)
+        if refused:
+            raise ValueError(f"Settings not accepted by the server: {', '.join(sorted(refused))}")
+        settings = LabelSettings.from_dict(values)
+        settings.validate()
+        count_lines(lines)  # Reject malformed sequence specs before rendering
+        return lines, settings, bool(batched)
+
+    def _send_pdf(self, output_file, result, headers):
+        # Stream the PDF from disk rather than reading it into memory
+        started = time.perf_counter()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/pdf')
+        self.send_header('Content-Length', str(os.path.getsize(output_file)))
+        self.send_header('X-Label-Count', str(result.label_count))
+        self.send_header('X-Sheet-Count', str(result.sheet_count))
+        for name, value in headers.items():
+            self.send_header(name, str(value))
+        self.end_headers()
+        with open(output_file, 'rb') as f:
+            shutil.copyfileobj(f, self.wfile, STREAM_CHUNK)
+        self.server.service.record('stream', time.perf_counter() - started)
+
+    def _send_json(self, status, value):
+        body = json.dumps(value, indent=2).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+if hasattr(socket, 'AF_UNIX'):
+    class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve label PDFs over HTTP from warm worker processes.")
+    parser.add_argument('--host', default='127.0.0.1', help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f"TCP port (default: {DEFAULT_PORT})")
+    if hasattr(socket, 'AF_UNIX'):
+        parser.add_argument('--unix-socket', metavar='PATH', help="listen on a Unix socket instead of TCP")
+    parser.add_argument('--workers', type=int, default=0, help="worker processes (default: one per CPU)")
+    parser.add_argument('--batch-window', type=float, default=BATCH_WINDOW,
+                        help=f"seconds batched requests wait for more labels (default: {BATCH_WINDOW})")
+    parser.add_argument('--temp-dir', help="directory for PDFs being rendered (default: system temp)")
+    args = parser.parse_args(argv)
+
+    service = LabelService(args.workers, args.batch_window, args.temp_dir)
+    service.warm_up()
+    if getattr(args, 'unix_socket', None):
+        _remove_file(args.unix_socket)
+        server = ThreadingUnixHTTPServer(args.unix_socket, LabelRequestHandler)
+        where = args.unix_socket
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), LabelRequestHandler)
+        where = f"http://{args.host}:{server.server_address[1]}"
+    server.service = service
+    print(f"Serving labels on {where} with {service.workers} workers", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,215 +1,116 @@
+import time
+startup_start = time.perf_counter()  # Before the imports, for --startup-time
 import tkinter as tk
-from tkinter import messagebox, filedialog, colorchooser
+from tkinter import messagebox, filedialog, colorchooser, simpledialog
 from tkinter import ttk
 import tkinter.font as tkfont
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.units import mm
-from reportlab.lib.utils import ImageReader
-from PIL import Image
-import qrcode
-import io
-import math  # Imported math for ceiling function
-
-# Helper functions for unit conversion
-def mm_to_points(mm_value):
-    return mm_value * 72 / 25.4
-
-def points_to_mm(points_value):
-    return points_value * 25.4 / 72
-
-def generate_pdf(part_numbers, settings):
+# label_core (reportlab, PIL, qrcode, NumPy) is imported on first generate;
+# the preview only needs the layout maths
+from label_layout import PAGE_SIZE, QR_TEXT_GAP_MM, SheetLayout, mm_to_points
+from font_index import family_names, load_index
+from part_sources import PartFile
+from sequences import count_lines, expand_lines
+import os
+import queue
+import sys
+import threading
+
+# Messages from the generation worker thread, drained on the Tk thread
+generation_queue = queue.Queue()
+# State of the running generation job (empty when idle)
+current_job = {}
+# Font families found by the background font scan, drained on the Tk thread
+font_queue = queue.Queue()
+
+# Milliseconds to wait for further changes before redrawing the preview
+PREVIEW_DELAY_MS = 30
+
+# Pending redraw, last drawn layout, and the canvas items owned by each slot
+preview_state = {'after_id': None, 'layout': None, 'slots': []}
+
+# Imported part number file shown instead of the text box (None while typing),
+# and the first row currently shown in its view
+input_state = {'source': None, 'first_row': 0}
+
+def load_font_families():
+    # Standard families plus those in the font registry's index from the
+    # last scan; reading the index does not load reportlab
+    return family_names(load_index())
+
+def scan_font_families():
+    # Worker thread: list the families PDFs can use (standard fonts and
+    # installed TrueType files, which means walking every font directory;
+    # the registry updates its index for the next start). Never touches Tk;
+    # the result goes through font_queue (None on failure).
+    families = None
     try:
-        # Create a PDF canvas
-        c = canvas.Canvas(settings['output_file'], pagesize=letter)
-        page_width, page_height = letter  # in points
-
-        # Unpack settings
-        left_margin = mm_to_points(float(settings['left_margin']))
-        top_margin = mm_to_points(float(settings['top_margin']))
-        label_width = mm_to_points(float(settings['label_width']))
-        label_height = mm_to_points(float(settings['label_height']))
-        x_pitch = mm_to_points(float(settings['x_pitch']))
-        y_pitch = mm_to_points(float(settings['y_pitch']))
-        labels_x = int(settings['labels_x'])
-        labels_y = int(settings['labels_y'])
-        draw_rectangles = settings['draw_rectangles']
-        center_horizontally = settings['center_horizontally']
-        center_vertically = settings['center_vertically']
-        start_index = int(settings['start_index'])
-        dynamic_text_size = settings['dynamic_text_size']
-        enable_qr = settings['enable_qr']
-        font_size = int(settings['font_size'])
-        font_family = settings['font_family']
-        font_bold = settings['font_bold']
-        font_italic = settings['font_italic']
-        font_color = settings['font_color']
-        text_justification = settings['text_justification']
-
-        # Validate Label Start Index
-        labels_per_sheet = labels_x * labels_y
-        if start_index < 0 or start_index >= labels_per_sheet:
-            messagebox.showerror("Error", f"Label Start Index must be between 0 and {labels_per_sheet - 1}.")
-            return
-
-        # Calculate total number of sheets required
-        total_part_numbers = len(part_numbers)
-        labels_available_first_sheet = labels_per_sheet - start_index
-        remaining_labels = total_part_numbers - labels_available_first_sheet
-
-        if remaining_labels <= 0:
-            total_sheets = 1
-        else:
-            total_sheets = 1 + math.ceil(remaining_labels / labels_per_sheet)
-
-        # Unpack font settings
-        font_name = font_family
-        if font_bold and font_italic:
-            font_name += '-BoldOblique'
-        elif font_bold:
-            font_name += '-Bold'
-        elif font_italic:
-            font_name += '-Oblique'
-
-        # Adjust margins for centering
-        total_label_width = (labels_x - 1) * x_pitch + label_width
-        total_label_height = (labels_y - 1) * y_pitch + label_height
-
-        if center_horizontally:
-            left_margin = (page_width - total_label_width) / 2
-
-        if center_vertically:
-            top_margin = (page_height - total_label_height) / 2
-
-        # Initialize part index
-        part_index = 0
-        sheet_number = 1
-
-        while part_index < total_part_numbers:
-            for label_pos in range(labels_per_sheet):
-                # Skip labels before start_index on the first sheet
-                if sheet_number == 1 and label_pos < start_index:
-                    continue
-
-                if part_index >= total_part_numbers:
-                    break
-
-                # Calculate row and column based on label position
-                row = label_pos // labels_x
-                col = label_pos % labels_x
-
-                # Calculate label position
-                x_position = left_margin + col * x_pitch
-                y_position = page_height - (top_margin + row * y_pitch + label_height)
-
-                # Draw debugging rectangle if option is selected
-                if draw_rectangles:
-                    c.roundRect(x_position, y_position, label_width, label_height, radius=5, stroke=1, fill=0)
-
-                part = part_numbers[part_index]
-                if part.strip() != '':
-                    # Define padding
-                    padding = mm_to_points(1)  # 1 mm padding
-                    content_width = label_width - 2 * padding
-
-                    if enable_qr:
-                        # Generate QR code with optimized parameters
-                        qr = qrcode.QRCode(
-                            version=None,  # Let qrcode determine the smallest version possible
-                            error_correction=qrcode.constants.ERROR_CORRECT_M,  # Medium error correction
-                            box_size=8,  # Adjust box_size for better readability
-                            border=4,  # Adequate border
-                        )
-                        qr.add_data(part)
-                        qr.make(fit=True)
-                        img = qr.make_image(fill_color="black", back_color="white")
-                        img_buffer = io.BytesIO()
-                        img.save(img_buffer, format='PNG')
-                        img_buffer.seek(0)
-                        img_reader = ImageReader(img_buffer)
-
-                        qr_size = label_height - 2 * padding
-                        c.drawImage(
-                            img_reader,
-                            x_position + padding,
-                            y_position + padding,
-                            width=qr_size,
-                            height=qr_size
-                        )
-
-                        text_x = x_position + padding + qr_size + mm_to_points(1)  # Additional 1 mm spacing
-                        available_width = content_width - qr_size - mm_to_points(1)
-                    else:
-                        # QR codes disabled; draw text in place of QR code
-                        text_x = x_position + padding
-                        available_width = content_width
-
-                    # Draw part number text
-                    text_y = y_position + label_height / 2 - font_size / 2  # Adjust text position
-
-                    # Dynamic text size
-                    current_font_size = font_size
-                    if dynamic_text_size:
-                        text_width = c.stringWidth(part[:40], font_name, current_font_size)
-                        while text_width > available_width and current_font_size > 6:
-                            current_font_size -= 0.5
-                            text_width = c.stringWidth(part[:40], font_name, current_font_size)
-                        c.setFont(font_name, current_font_size)
-                    else:
-                        c.setFont(font_name, current_font_size)
-
-                    # Set font color
-                    try:
-                        c.setFillColor(font_color)
-                    except:
-                        c.setFillColor("black")  # Fallback to black if color is invalid
-
-                    # Handle text justification
-                    if text_justification == 'Left':
-                        c.drawString(text_x, text_y, part[:40])  # Ensure max 40 characters
-                    elif text_justification == 'Center':
-                        center_x = x_position + label_width / 2
-                        c.drawCentredString(center_x, text_y, part[:40])
-                    elif text_justification == 'Right':
-                        right_x = x_position + label_width - padding
-                        c.drawRightString(right_x, text_y, part[:40])
-
-                    # Reset fill color to black
-                    c.setFillColor("black")
-
-                part_index += 1
-
-            if part_index < total_part_numbers:
-                # More part numbers to process, create a new page
-                c.showPage()
-                sheet_number += 1
-                # Reset start_index for new pages
-                start_index = 0
-                # Adjust margins again if centering is enabled
-                if center_horizontally:
-                    left_margin = (page_width - total_label_width) / 2
-                if center_vertically:
-                    top_margin = (page_height - total_label_height) / 2
-            else:
-                break  # All part numbers processed
+        import font_registry
 
-        c.save()
-        messagebox.showinfo("Success", f"PDF generated successfully at:\n{settings['output_file']}\nNumber of sheets required: {total_sheets}")
-    except Exception as e:
-        messagebox.showerror("Error", str(e))
+        families = font_registry.font_families()
+    finally:
+        font_queue.put(families)
+
+def refresh_font_families(on_done=None):
+    # Rescan the font families in the background; poll_font_families updates
+    # the menu and then calls on_done on the Tk thread
+    threading.Thread(target=scan_font_families, daemon=True).start()
+    root.after(50, poll_font_families, on_done)
+
+def poll_font_families(on_done):
+    try:
+        families = font_queue.get_nowait()
+    except queue.Empty:
+        root.after(50, poll_font_families, on_done)
+        return
+    if families and families != available_fonts:
+        available_fonts[:] = families
+        font_family_menu.configure(values=families)
+    if on_done is not None:
+        on_done()
+
+def finish_startup():
+    # First idle moment after the widgets are built: draw the window, then
+    # do the deferred startup work
+    root.update_idletasks()
+    window_ready = time.perf_counter()
+
+    def report_startup():
+        # Report cold start latency and exit, e.g. for timing in a loop
+        fonts_ready = time.perf_counter()
+        print(f"imports: {imports_done - startup_start:.3f}s, window: {window_ready - startup_start:.3f}s, "
+              f"font list (background): {fonts_ready - window_ready:.3f}s, "
+              f"label_core imported: {'yes' if 'label_core' in sys.modules else 'no'}")
+        root.destroy()
+
+    refresh_font_families(report_startup if '--startup-time' in sys.argv else None)
+
+def schedule_preview(event=None):
+    # Coalesce bursts of changes (keystrokes, resize events) into one redraw
+    if preview_state['after_id'] is None:
+        preview_state['after_id'] = preview_canvas.after(PREVIEW_DELAY_MS, update_preview)
+
+def create_preview_slot():
+    # Canvas items for one label slot; they are moved and restyled, never recreated
+    return {
+        'outline': preview_canvas.create_rectangle(0, 0, 0, 0, outline='black'),
+        'cross_1': preview_canvas.create_line(0, 0, 0, 0, fill='red', width=2),
+        'cross_2': preview_canvas.create_line(0, 0, 0, 0, fill='red', width=2),
+        'qr': preview_canvas.create_rectangle(0, 0, 0, 0, fill='gray'),
+        'placeholder': preview_canvas.create_text(0, 0, text="Text", anchor='center'),
+        'index': preview_canvas.create_text(0, 0, anchor='w'),
+    }
 
 def update_preview(event=None):
-    # Clear the canvas
-    preview_canvas.delete('all')
+    preview_state['after_id'] = None
 
     # Get settings from input fields
     try:
-        left_margin = mm_to_points(float(left_margin_var.get()))
-        top_margin = mm_to_points(float(top_margin_var.get()))
-        label_width = mm_to_points(float(label_width_var.get()))
-        label_height = mm_to_points(float(label_height_var.get()))
-        x_pitch = mm_to_points(float(x_pitch_var.get()))
-        y_pitch = mm_to_points(float(y_pitch_var.get()))
+        left_margin = float(left_margin_var.get())
+        top_margin = float(top_margin_var.get())
+        label_width = float(label_width_var.get())
+        label_height = float(label_height_var.get())
+        x_pitch = float(x_pitch_var.get())
+        y_pitch = float(y_pitch_var.get())
         labels_x = int(labels_x_var.get())
         labels_y = int(labels_y_var.get())
         center_horizontally = center_horizontally_var.get()
@@ -220,7 +121,7 @@ def update_preview(event=None):
         # Invalid input; do not update preview
         return
 
-    page_width, page_height = letter  # in points
+    page_width, page_height = PAGE_SIZE  # in points
 
     canvas_width = preview_canvas.winfo_width()
     canvas_height = preview_canvas.winfo_height()
@@ -228,135 +129,324 @@ def update_preview(event=None):
     # Ensure canvas has a size
     if canvas_width < 10 or canvas_height < 10:
         # Canvas hasn't been properly initialized yet
-        preview_canvas.after(100, update_preview)
+        schedule_preview()
+        return
+
+    # Nothing that affects the preview changed since the last redraw
+    layout = (left_margin, top_margin, label_width, label_height, x_pitch, y_pitch, labels_x, labels_y,
+              center_horizontally, center_vertically, start_index, enable_qr, canvas_width, canvas_height)
+    if layout == preview_state['layout']:
         return
+    preview_state['layout'] = layout
 
     scale_x = canvas_width / page_width
     scale_y = canvas_height / page_height
 
     scale = min(scale_x, scale_y)
 
-    # Adjust margins for centering
-    total_label_width = (labels_x -1) * x_pitch + label_width
-    total_label_height = (labels_y -1) * y_pitch + label_height
+    # Same slot table the PDF renderer uses
+    sheet = SheetLayout.plan(left_margin, top_margin, label_width, label_height, x_pitch, y_pitch,
+                             max(labels_x, 0), max(labels_y, 0), center_horizontally, center_vertically)
+
+    # Grow the item pool when the grid gets bigger; surplus slots are hidden
+    label_count = max(labels_x, 0) * max(labels_y, 0)
+    slots = preview_state['slots']
+    while len(slots) < label_count:
+        slots.append(create_preview_slot())
+    for items in slots[label_count:]:
+        for item in items.values():
+            preview_canvas.itemconfigure(item, state='hidden')
+
+    font = ('Helvetica', int(6 * scale))
+    padding = sheet.padding * scale
+    qr_size = sheet.qr_size * scale
+    width_scaled = sheet.label_width * scale
+    height_scaled = sheet.label_height * scale
+
+    # Move and restyle the label slots
+    for i, slot in enumerate(sheet.slots):
+        items = slots[i]
+        # Canvas y runs down from the top of the page
+        x_position = slot.x * scale
+        y_position = (page_height - slot.y) * scale - height_scaled
+
+        preview_canvas.coords(items['outline'], x_position, y_position,
+                              x_position + width_scaled, y_position + height_scaled)
+        preview_canvas.itemconfigure(items['outline'], state='normal')
 
-    if center_horizontally:
-        left_margin_scaled = (page_width - total_label_width) / 2 * scale
-    else:
-        left_margin_scaled = left_margin * scale
+        # Determine if this label is skipped
+        skipped = i < start_index
+        # Red X over skipped labels
+        preview_canvas.coords(items['cross_1'], x_position, y_position,
+                              x_position + width_scaled, y_position + height_scaled)
+        preview_canvas.coords(items['cross_2'], x_position, y_position + height_scaled,
+                              x_position + width_scaled, y_position)
+        cross_state = 'normal' if skipped else 'hidden'
+        preview_canvas.itemconfigure(items['cross_1'], state=cross_state)
+        preview_canvas.itemconfigure(items['cross_2'], state=cross_state)
+
+        # QR code placeholder, or text placeholder where the QR code would be
+        preview_canvas.coords(items['qr'], x_position + padding, y_position + padding,
+                              x_position + padding + qr_size, y_position + padding + qr_size)
+        preview_canvas.itemconfigure(items['qr'], state='normal' if not skipped and enable_qr else 'hidden')
+        preview_canvas.coords(items['placeholder'], x_position + padding + qr_size / 2,
+                              y_position + padding + qr_size / 2)
+        preview_canvas.itemconfigure(items['placeholder'], font=font,
+                                     state='normal' if not skipped and not enable_qr else 'hidden')
+
+        # Part number placeholder (label index)
+        text_x = x_position + padding + qr_size + mm_to_points(QR_TEXT_GAP_MM) * scale
+        text_y = y_position + height_scaled / 2
+        preview_canvas.coords(items['index'], text_x, text_y)
+        preview_canvas.itemconfigure(items['index'], text=str(i - start_index), font=font,
+                                     state='hidden' if skipped else 'normal')
 
-    if center_vertically:
-        top_margin_scaled = (page_height - total_label_height) / 2 * scale
-    else:
-        top_margin_scaled = top_margin * scale
-
-    # Draw labels
-    label_count = labels_x * labels_y
-    for i in range(label_count):
-        row = i // labels_x
-        col = i % labels_x
-        x_position = left_margin_scaled + col * x_pitch * scale
-        y_position = top_margin_scaled + row * y_pitch * scale
-
-        # Draw rectangle
-        preview_canvas.create_rectangle(
-            x_position,
-            y_position,
-            x_position + label_width * scale,
-            y_position + label_height * scale,
-            outline='black'
-        )
+def on_variable_change(*args):
+    schedule_preview()
+
+def import_part_file():
+    if current_job:
+        return  # The running job may be reading the current file
+    path = filedialog.askopenfilename(title="Import Part Numbers",
+                                      filetypes=[("Part number files", "*.txt *.csv *.tsv *.tab"), ("All files", "*.*")])
+    if not path:
+        return
 
-        # Determine if this label is skipped
-        if i < start_index:
-            # Draw red X over the label
-            preview_canvas.create_line(
-                x_position, y_position,
-                x_position + label_width * scale, y_position + label_height * scale,
-                fill='red', width=2
-            )
-            preview_canvas.create_line(
-                x_position, y_position + label_height * scale,
-                x_position + label_width * scale, y_position,
-                fill='red', width=2
-            )
-        else:
-            # Optionally draw QR code or text placeholder
-            padding = mm_to_points(1) * scale
-            qr_size = label_height * scale - 2 * padding
-
-            if enable_qr:
-                # Draw QR code placeholder
-                preview_canvas.create_rectangle(
-                    x_position + padding,
-                    y_position + padding,
-                    x_position + padding + qr_size,
-                    y_position + padding + qr_size,
-                    fill='gray'
-                )
+    try:
+        source = PartFile(path)
+        if source.delimiter is not None and source.first_row_cells():
+            # Confirm the detected header row, which detection misses on
+            # some exports (e.g. a single 'Part Number' column)
+            has_header = messagebox.askyesnocancel(
+                "Header Row",
+                f"Is the first row column names rather than part numbers?\n\n{', '.join(source.first_row_cells())}",
+                default=messagebox.YES if source.header is not None else messagebox.NO, parent=root)
+            if has_header is None:
+                source.close()
+                return
+            source.set_header(has_header)
+
+            # Ask which column holds the part numbers
+            if source.header:
+                choices = ', '.join(source.header)
+                initial = source.header[0]
             else:
-                # Draw text placeholder where QR code would be
-                preview_canvas.create_text(
-                    x_position + padding + qr_size / 2,
-                    y_position + padding + qr_size / 2,
-                    text="Text",
-                    anchor='center',
-                    font=('Helvetica', int(6 * scale))
-                )
-
-            # Draw part number placeholder (e.g., label index)
-            part = str(i - start_index)
-            text_x = x_position + padding + qr_size + mm_to_points(1) * scale  # Additional 1 mm spacing
-            text_y = y_position + label_height * scale / 2
-            preview_canvas.create_text(
-                text_x,
-                text_y,
-                text=part,
-                anchor='w',
-                font=('Helvetica', int(6 * scale))
-            )
-
-    # Update the canvas
-    preview_canvas.update()
+                choices = "0 for the first column, 1 for the second, ..."
+                initial = '0'
+            column = simpledialog.askstring("Part Number Column", f"Column with the part numbers ({choices}):",
+                                            initialvalue=initial, parent=root)
+            if column is None:
+                source.close()
+                return
+            source.select_column(column.strip())
+    except (OSError, ValueError) as e:
+        messagebox.showerror("Error", str(e))
+        return
 
-def on_variable_change(*args):
-    update_preview()
+    close_part_file()
+    input_state['source'] = source
+    input_state['first_row'] = 0
+    file_name_var.set(f"{os.path.basename(path)}: {len(source)} rows")
+    text_input.grid_remove()
+    frame_file.grid()
+    render_file_view()
+
+def close_part_file():
+    # Go back to the text box
+    if current_job:
+        return
+    source = input_state['source']
+    if source is not None:
+        source.close()
+        input_state['source'] = None
+    frame_file.grid_remove()
+    text_input.grid()
+
+def visible_file_rows():
+    line_height = tkfont.nametofont(file_list.cget('font')).metrics('linespace') + 1
+    return max(file_list.winfo_height() // line_height, 1)
+
+def render_file_view(event=None):
+    # Only the rows that fit in the list are read from the file and shown
+    source = input_state['source']
+    if source is None:
+        return
+    visible = visible_file_rows()
+    first = min(max(input_state['first_row'], 0), max(len(source) - visible, 0))
+    input_state['first_row'] = first
+    file_list.delete(0, tk.END)
+    for index, row in enumerate(source.rows(first, first + visible), first + 1):
+        file_list.insert(tk.END, f"{index:>8}  {row}")
+    total = max(len(source), 1)
+    file_scrollbar.set(first / total, min((first + visible) / total, 1.0))
+
+def scroll_file_view(*args):
+    # Scrollbar command: ('moveto', fraction) or ('scroll', count, 'units'/'pages')
+    source = input_state['source']
+    if source is None:
+        return
+    if args[0] == 'moveto':
+        input_state['first_row'] = int(float(args[1]) * len(source))
+    elif args[0] == 'scroll':
+        step = visible_file_rows() if args[2] == 'pages' else 1
+        input_state['first_row'] += int(args[1]) * step
+    render_file_view()
+
+def on_file_wheel(event):
+    # Windows/macOS report a delta, X11 sends Button-4/5
+    if event.num == 4 or event.delta > 0:
+        scroll_file_view('scroll', -3, 'units')
+    else:
+        scroll_file_view('scroll', 3, 'units')
+    return 'break'
 
 def on_generate():
-    # Get part numbers from text field
-    part_numbers = text_input.get("1.0", tk.END).strip().split('\n')
-    part_numbers = [p.strip() for p in part_numbers if p.strip() != '']
+    if current_job:
+        return  # A job is already running
+
+    # Rows of the imported file, or lines of the text field; either way
+    # sequence specs are only expanded while generating
+    source = input_state['source']
+    if source is None:
+        lines = text_input.get("1.0", tk.END).split('\n')
+
+    from label_core import LabelSettings
 
     # Get settings from input fields
-    settings = {
-        'left_margin': left_margin_var.get(),
-        'top_margin': top_margin_var.get(),
-        'label_width': label_width_var.get(),
-        'label_height': label_height_var.get(),
-        'x_pitch': x_pitch_var.get(),
-        'y_pitch': y_pitch_var.get(),
-        'labels_x': labels_x_var.get(),
-        'labels_y': labels_y_var.get(),
-        'draw_rectangles': draw_rectangles_var.get(),
-        'center_horizontally': center_horizontally_var.get(),
-        'center_vertically': center_vertically_var.get(),
-        'start_index': label_start_index_var.get(),
-        'dynamic_text_size': dynamic_text_size_var.get(),
-        'enable_qr': enable_qr_var.get(),
-        'font_size': font_size_var.get(),
-        'font_family': font_family_var.get(),
-        'font_bold': font_bold_var.get(),
-        'font_italic': font_italic_var.get(),
-        'font_color': font_color_var.get(),
-        'text_justification': text_justification_var.get(),
-        'output_file': filedialog.asksaveasfilename(defaultextension=".pdf", filetypes=[("PDF files", "*.pdf")])
-    }
+    try:
+        settings = LabelSettings.from_dict({
+            'left_margin': left_margin_var.get(),
+            'top_margin': top_margin_var.get(),
+            'label_width': label_width_var.get(),
+            'label_height': label_height_var.get(),
+            'x_pitch': x_pitch_var.get(),
+            'y_pitch': y_pitch_var.get(),
+            'labels_x': labels_x_var.get(),
+            'labels_y': labels_y_var.get(),
+            'draw_rectangles': draw_rectangles_var.get(),
+            'center_horizontally': center_horizontally_var.get(),
+            'center_vertically': center_vertically_var.get(),
+            'start_index': label_start_index_var.get(),
+            'dynamic_text_size': dynamic_text_size_var.get(),
+            'enable_qr': enable_qr_var.get(),
+            'font_size': font_size_var.get(),
+            'font_family': font_family_var.get(),
+            'font_bold': font_bold_var.get(),
+            'font_italic': font_italic_var.get(),
+            'font_color': font_color_var.get(),
+            'text_justification': text_justification_var.get(),
+            'qr_mode': qr_mode_var.get(),
+            'qr_workers': qr_workers_var.get(),
+            'max_text_lines': max_text_lines_var.get(),
+            'header_text': header_text_var.get(),
+            'logo_file': logo_file_var.get().strip(),
+        })
+        # Font resolution can block on the background font scan or parse a
+        # font file, so it is left to run_generation
+        settings.validate(fonts=False)
+    except ValueError as e:
+        messagebox.showerror("Error", str(e))
+        return
 
-    if not settings['output_file']:
+    output_file = filedialog.asksaveasfilename(defaultextension=".pdf", filetypes=[("PDF files", "*.pdf")])
+    if not output_file:
         return  # User cancelled the file dialog
 
-    generate_pdf(part_numbers, settings)
-    update_preview()
+    # Run the job on a worker thread so the window stays responsive. Counting
+    # the labels reads the whole input, so the worker does that too and the
+    # progress bar is indeterminate until the total arrives.
+    current_job.update(
+        total=None,
+        start_time=time.perf_counter(),
+        cancel_event=threading.Event(),
+    )
+    worker = threading.Thread(
+        target=run_generation,
+        args=(iter(source) if source is not None else expand_lines(lines),
+              source.count if source is not None else lambda: count_lines(lines),
+              output_file, settings, current_job['cancel_event']),
+        daemon=True,
+    )
+    generate_button.state(['disabled'])
+    cancel_button.state(['!disabled'])
+    progress_bar.configure(mode='indeterminate', value=0)
+    progress_bar.start()
+    progress_var.set("Counting labels...")
+    worker.start()
+    root.after(100, poll_generation)
+
+def run_generation(part_numbers, count_parts, output_file, settings, cancel_event):
+    # Worker thread: never touches Tk, only reports through generation_queue
+    from label_core import GenerationCancelled, generate_pdf
+
+    def progress(labels_done, sheets_done):
+        generation_queue.put(('progress', labels_done, sheets_done))
+
+    try:
+        # Resolve and register the font here rather than on the Tk thread;
+        # an unknown family is reported like any other failure
+        settings.validate()
+        generation_queue.put(('total', count_parts()))
+        result = generate_pdf(part_numbers, output_file, settings, progress, cancel_event)
+    except GenerationCancelled:
+        generation_queue.put(('cancelled',))
+    except Exception as e:
+        generation_queue.put(('error', str(e)))
+    else:
+        generation_queue.put(('done', result))
+
+def poll_generation():
+    # Apply worker messages to the progress widgets; reschedule until the job ends
+    finished = None
+    while True:
+        try:
+            message = generation_queue.get_nowait()
+        except queue.Empty:
+            break
+        if message[0] == 'progress':
+            update_progress(*message[1:])
+        elif message[0] == 'total':
+            current_job['total'] = message[1]
+            progress_bar.stop()
+            progress_bar.configure(mode='determinate', maximum=max(message[1], 1), value=0)
+            progress_var.set("Starting...")
+        else:
+            finished = message
+
+    if finished is None:
+        root.after(100, poll_generation)
+        return
+
+    progress_bar.stop()
+    progress_bar.configure(mode='determinate')
+    if finished[0] == 'done':
+        update_progress(finished[1].label_count, finished[1].sheet_count)
+    current_job.clear()
+    generate_button.state(['!disabled'])
+    cancel_button.state(['disabled'])
+    if finished[0] == 'done':
+        messagebox.showinfo("Success", finished[1].summary())
+    elif finished[0] == 'cancelled':
+        progress_bar.configure(value=0)
+        progress_var.set("Cancelled; partial output removed.")
+    else:
+        progress_var.set("Failed.")
+        messagebox.showerror("Error", finished[1])
+
+def update_progress(labels_done, sheets_done):
+    elapsed = time.perf_counter() - current_job['start_time'] if current_job else 0
+    rate = labels_done / elapsed if elapsed > 0 else 0
+    status = f"{labels_done} labels, {sheets_done} sheets, {rate:.0f} labels/sec"
+    if current_job and current_job['total'] is not None and rate > 0:
+        remaining = max(current_job['total'] - labels_done, 0)
+        status += f", ETA {remaining / rate:.0f}s"
+    progress_bar.configure(value=labels_done)
+    progress_var.set(status)
+
+def on_cancel():
+    if current_job:
+        current_job['cancel_event'].set()
+        progress_var.set("Cancelling...")
 
 def on_escape(event):
     root.quit()
@@ -369,181 +459,255 @@ def choose_color():
     if color_code and color_code[1]:
         font_color_var.set(color_code[1])
 
-# Create the main window
-root = tk.Tk()
-root.title("Label QR Code Generator")
-root.geometry("1200x700")  # Set a reasonable default size
-
-# Configure grid weights to allow resizing
-root.grid_rowconfigure(0, weight=1)
-root.grid_columnconfigure(0, weight=1)
-root.grid_columnconfigure(1, weight=1)
-root.grid_columnconfigure(2, weight=1)
-
-# Top Frame for Part Numbers and Preview
-frame_top = ttk.Frame(root)
-frame_top.grid(row=0, column=0, columnspan=3, sticky='nsew', padx=10, pady=10)
-frame_top.grid_rowconfigure(1, weight=1)
-frame_top.grid_columnconfigure(0, weight=1)
-frame_top.grid_columnconfigure(1, weight=1)
-
-# Part numbers input
-ttk.Label(frame_top, text="Enter part numbers (one per line, max 40 characters):").grid(row=0, column=0, sticky='w')
-text_input = tk.Text(frame_top, width=50, height=20)
-text_input.grid(row=1, column=0, padx=5, pady=5, sticky='nsew')
-
-# Preview Canvas
-ttk.Label(frame_top, text="Preview:").grid(row=0, column=1, sticky='w')
-preview_canvas = tk.Canvas(frame_top, bg='white')
-preview_canvas.grid(row=1, column=1, padx=5, pady=5, sticky='nsew')
-
-# Bind the configure event to update the preview when the canvas is resized
-preview_canvas.bind("<Configure>", update_preview)
-
-# Bottom Frame for Settings
-frame_bottom = ttk.Frame(root)
-frame_bottom.grid(row=1, column=0, columnspan=3, sticky='nsew', padx=10, pady=10)
-frame_bottom.grid_columnconfigure(0, weight=1)
-frame_bottom.grid_columnconfigure(1, weight=1)
-frame_bottom.grid_columnconfigure(2, weight=1)
-
-# Miscellaneous Settings
-frame_misc = ttk.LabelFrame(frame_bottom, text="Miscellaneous Settings")
-frame_misc.grid(row=0, column=0, padx=5, pady=5, sticky='nsew')
-
-enable_qr_var = tk.BooleanVar(value=True)
-enable_qr_check = ttk.Checkbutton(frame_misc, text="Enable QR Codes", variable=enable_qr_var)
-enable_qr_check.grid(row=0, column=0, sticky='w', padx=5, pady=2)
-
-draw_rectangles_var = tk.BooleanVar()
-draw_rectangles_check = ttk.Checkbutton(frame_misc, text="Draw Rounded Rectangles (Debug)", variable=draw_rectangles_var)
-draw_rectangles_check.grid(row=1, column=0, sticky='w', padx=5, pady=2)
-
-center_horizontally_var = tk.BooleanVar(value=True)  # Set to True by default
-center_horizontally_check = ttk.Checkbutton(frame_misc, text="Center Horizontally", variable=center_horizontally_var)
-center_horizontally_check.grid(row=2, column=0, sticky='w', padx=5, pady=2)
-
-center_vertically_var = tk.BooleanVar(value=True)  # Set to True by default
-center_vertically_check = ttk.Checkbutton(frame_misc, text="Center Vertically", variable=center_vertically_var)
-center_vertically_check.grid(row=3, column=0, sticky='w', padx=5, pady=2)
-
-dynamic_text_size_var = tk.BooleanVar()
-dynamic_text_size_check = ttk.Checkbutton(frame_misc, text="Dynamic Text Size", variable=dynamic_text_size_var)
-dynamic_text_size_check.grid(row=4, column=0, sticky='w', padx=5, pady=2)
-
-# Grid Adjustment Parameters
-frame_grid = ttk.LabelFrame(frame_bottom, text="Grid Adjustment Parameters (mm)")
-frame_grid.grid(row=0, column=1, padx=5, pady=5, sticky='nsew')
-frame_grid.grid_columnconfigure(0, weight=1)
-frame_grid.grid_columnconfigure(1, weight=1)
-
-left_margin_var = tk.StringVar(value="4.05")
-top_margin_var = tk.StringVar(value="12.837")
-label_width_var = tk.StringVar(value="44.24")
-label_height_var = tk.StringVar(value="12.47")
-x_pitch_var = tk.StringVar(value="51.95")
-y_pitch_var = tk.StringVar(value="12.6863")
-labels_x_var = tk.StringVar(value="4")
-labels_y_var = tk.StringVar(value="20")
-label_start_index_var = tk.StringVar(value="0")
-
-ttk.Label(frame_grid, text="Left Margin:").grid(row=0, column=0, sticky='e', padx=5, pady=2)
-ttk.Entry(frame_grid, textvariable=left_margin_var, width=10).grid(row=0, column=1, sticky='w', padx=5, pady=2)
-
-ttk.Label(frame_grid, text="Top Margin:").grid(row=1, column=0, sticky='e', padx=5, pady=2)
-ttk.Entry(frame_grid, textvariable=top_margin_var, width=10).grid(row=1, column=1, sticky='w', padx=5, pady=2)
-
-ttk.Label(frame_grid, text="Label Width:").grid(row=2, column=0, sticky='e', padx=5, pady=2)
-ttk.Entry(frame_grid, textvariable=label_width_var, width=10).grid(row=2, column=1, sticky='w', padx=5, pady=2)
-
-ttk.Label(frame_grid, text="Label Height:").grid(row=3, column=0, sticky='e', padx=5, pady=2)
-ttk.Entry(frame_grid, textvariable=label_height_var, width=10).grid(row=3, column=1, sticky='w', padx=5, pady=2)
-
-ttk.Label(frame_grid, text="X Pitch:").grid(row=4, column=0, sticky='e', padx=5, pady=2)
-ttk.Entry(frame_grid, textvariable=x_pitch_var, width=10).grid(row=4, column=1, sticky='w', padx=5, pady=2)
-
-ttk.Label(frame_grid, text="Y Pitch:").grid(row=5, column=0, sticky='e', padx=5, pady=2)
-ttk.Entry(frame_grid, textvariable=y_pitch_var, width=10).grid(row=5, column=1, sticky='w', padx=5, pady=2)
-
-ttk.Label(frame_grid, text="Labels in X:").grid(row=6, column=0, sticky='e', padx=5, pady=2)
-ttk.Entry(frame_grid, textvariable=labels_x_var, width=10).grid(row=6, column=1, sticky='w', padx=5, pady=2)
-
-ttk.Label(frame_grid, text="Labels in Y:").grid(row=7, column=0, sticky='e', padx=5, pady=2)
-ttk.Entry(frame_grid, textvariable=labels_y_var, width=10).grid(row=7, column=1, sticky='w', padx=5, pady=2)
-
-ttk.Label(frame_grid, text="Label Start Index:").grid(row=8, column=0, sticky='e', padx=5, pady=2)
-ttk.Entry(frame_grid, textvariable=label_start_index_var, width=10).grid(row=8, column=1, sticky='w', padx=5, pady=2)
-
-# Font Settings
-frame_font = ttk.LabelFrame(frame_bottom, text="Font Settings")
-frame_font.grid(row=0, column=2, padx=5, pady=5, sticky='nsew')
-frame_font.grid_columnconfigure(0, weight=1)
-frame_font.grid_columnconfigure(1, weight=1)
-
-font_size_var = tk.StringVar(value="12")  # Increased default font size
-font_family_var = tk.StringVar(value="Helvetica")
-font_bold_var = tk.BooleanVar()
-font_italic_var = tk.BooleanVar()
-font_color_var = tk.StringVar(value="black")
-text_justification_var = tk.StringVar(value="Left")
-
-# Get available font families
-available_fonts = sorted(tkfont.families())
-
-ttk.Label(frame_font, text="Font Size:").grid(row=0, column=0, sticky='e', padx=5, pady=2)
-ttk.Entry(frame_font, textvariable=font_size_var, width=10).grid(row=0, column=1, sticky='w', padx=5, pady=2)
-
-ttk.Label(frame_font, text="Font Family:").grid(row=1, column=0, sticky='e', padx=5, pady=2)
-font_family_menu = ttk.Combobox(frame_font, textvariable=font_family_var, values=available_fonts, state="readonly", width=12)
-font_family_menu.grid(row=1, column=1, sticky='w', padx=5, pady=2)
-font_family_menu.set("Helvetica")  # Set default value
-
-font_bold_check = ttk.Checkbutton(frame_font, text="Bold", variable=font_bold_var)
-font_bold_check.grid(row=2, column=0, sticky='w', padx=5, pady=2)
-
-font_italic_check = ttk.Checkbutton(frame_font, text="Italic", variable=font_italic_var)
-font_italic_check.grid(row=2, column=1, sticky='w', padx=5, pady=2)
-
-ttk.Label(frame_font, text="Font Color:").grid(row=3, column=0, sticky='e', padx=5, pady=2)
-frame_font_color = ttk.Frame(frame_font)
-frame_font_color.grid(row=3, column=1, sticky='w', padx=5, pady=2)
-ttk.Entry(frame_font_color, textvariable=font_color_var, width=10).grid(row=0, column=0, sticky='w')
-ttk.Button(frame_font_color, text="Choose", command=choose_color).grid(row=0, column=1, sticky='w', padx=5)
-
-ttk.Label(frame_font, text="Justification:").grid(row=4, column=0, sticky='e', padx=5, pady=2)
-justification_options = ["Left", "Center", "Right"]
-justification_menu = ttk.OptionMenu(frame_font, text_justification_var, "Left", *justification_options)
-justification_menu.grid(row=4, column=1, sticky='w', padx=5, pady=2)
-
-# Add red note above the generate button
-note_text = (
-    "Place in bypass tray with the label side down and with its header facing away from the printer.\n"
-    "Before printing ensure to print black and white to the bypass tray and set page sizing to Actual Size."
-)
-note_label = ttk.Label(root, text=note_text, foreground='red', justify='center')
-note_label.grid(row=2, column=0, columnspan=3, pady=(0, 5))
-
-# Generate button
-generate_button = ttk.Button(root, text="Generate PDF", command=on_generate)
-generate_button.grid(row=3, column=0, columnspan=3, pady=10)
-
-# Bind keys
-root.bind('<Escape>', on_escape)
-root.bind('<Control-s>', on_ctrl_s)
-
-# Trace variables to update preview
-variables_to_trace = [
-    left_margin_var, top_margin_var, label_width_var, label_height_var,
-    x_pitch_var, y_pitch_var, labels_x_var, labels_y_var,
-    center_horizontally_var, center_vertically_var, draw_rectangles_var,
-    label_start_index_var, enable_qr_var, font_size_var, font_family_var,
-    font_bold_var, font_italic_var, font_color_var, text_justification_var
-]
-
-for var in variables_to_trace:
-    var.trace_add('write', on_variable_change)
-
-# Initial update of preview
-root.after(100, update_preview)
-
-root.mainloop()
+def choose_logo():
+    logo_file = filedialog.askopenfilename(title="Choose Header Logo",
+                                           filetypes=[("Images", "*.png *.jpg *.jpeg *.gif *.bmp"), ("All files", "*.*")])
+    if logo_file:
+        logo_file_var.set(logo_file)
+
+if __name__ == '__main__':
+    imports_done = time.perf_counter()
+
+    # Create the main window
+    root = tk.Tk()
+    root.title("Label QR Code Generator")
+    root.geometry("1200x700")  # Set a reasonable default size
+
+    # Configure grid weights to allow resizing
+    root.grid_rowconfigure(0, weight=1)
+    root.grid_columnconfigure(0, weight=1)
+    root.grid_columnconfigure(1, weight=1)
+    root.grid_columnconfigure(2, weight=1)
+
+    # Top Frame for Part Numbers and Preview
+    frame_top = ttk.Frame(root)
+    frame_top.grid(row=0, column=0, columnspan=3, sticky='nsew', padx=10, pady=10)
+    frame_top.grid_rowconfigure(1, weight=1)
+    frame_top.grid_columnconfigure(0, weight=1)
+    frame_top.grid_columnconfigure(1, weight=1)
+
+    # Part numbers input
+    ttk.Label(frame_top, text="Enter part numbers (one per line, max 40 characters) or runs like BIN-A-{00001..50000}:").grid(row=0, column=0, sticky='w')
+    text_input = tk.Text(frame_top, width=50, height=20)
+    text_input.grid(row=1, column=0, padx=5, pady=5, sticky='nsew')
+
+    # Imported file view: a list holding only the visible rows, scrolled by hand
+    frame_file = ttk.Frame(frame_top)
+    frame_file.grid(row=1, column=0, padx=5, pady=5, sticky='nsew')
+    frame_file.grid_rowconfigure(1, weight=1)
+    frame_file.grid_columnconfigure(0, weight=1)
+    file_name_var = tk.StringVar()
+    ttk.Label(frame_file, textvariable=file_name_var).grid(row=0, column=0, sticky='w')
+    ttk.Button(frame_file, text="Close File", command=close_part_file).grid(row=0, column=1, sticky='e')
+    file_list = tk.Listbox(frame_file, activestyle='none', font='TkFixedFont')
+    file_list.grid(row=1, column=0, sticky='nsew')
+    file_scrollbar = ttk.Scrollbar(frame_file, orient='vertical', command=scroll_file_view)
+    file_scrollbar.grid(row=1, column=1, sticky='ns')
+    file_list.bind("<Configure>", render_file_view)
+    for wheel_event in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+        file_list.bind(wheel_event, on_file_wheel)
+    frame_file.grid_remove()
+    ttk.Button(frame_top, text="Import File...", command=import_part_file).grid(row=2, column=0, sticky='w', padx=5)
+
+    # Preview Canvas
+    ttk.Label(frame_top, text="Preview:").grid(row=0, column=1, sticky='w')
+    preview_canvas = tk.Canvas(frame_top, bg='white')
+    preview_canvas.grid(row=1, column=1, padx=5, pady=5, sticky='nsew')
+
+    # Bind the configure event to update the preview when the canvas is resized
+    preview_canvas.bind("<Configure>", schedule_preview)
+
+    # Bottom Frame for Settings
+    frame_bottom = ttk.Frame(root)
+    frame_bottom.grid(row=1, column=0, columnspan=3, sticky='nsew', padx=10, pady=10)
+    frame_bottom.grid_columnconfigure(0, weight=1)
+    frame_bottom.grid_columnconfigure(1, weight=1)
+    frame_bottom.grid_columnconfigure(2, weight=1)
+
+    # Miscellaneous Settings
+    frame_misc = ttk.LabelFrame(frame_bottom, text="Miscellaneous Settings")
+    frame_misc.grid(row=0, column=0, padx=5, pady=5, sticky='nsew')
+
+    enable_qr_var = tk.BooleanVar(value=True)
+    enable_qr_check = ttk.Checkbutton(frame_misc, text="Enable QR Codes", variable=enable_qr_var)
+    enable_qr_check.grid(row=0, column=0, sticky='w', padx=5, pady=2)
+
+    draw_rectangles_var = tk.BooleanVar()
+    draw_rectangles_check = ttk.Checkbutton(frame_misc, text="Draw Rounded Rectangles (Debug)", variable=draw_rectangles_var)
+    draw_rectangles_check.grid(row=1, column=0, sticky='w', padx=5, pady=2)
+
+    center_horizontally_var = tk.BooleanVar(value=True)  # Set to True by default
+    center_horizontally_check = ttk.Checkbutton(frame_misc, text="Center Horizontally", variable=center_horizontally_var)
+    center_horizontally_check.grid(row=2, column=0, sticky='w', padx=5, pady=2)
+
+    center_vertically_var = tk.BooleanVar(value=True)  # Set to True by default
+    center_vertically_check = ttk.Checkbutton(frame_misc, text="Center Vertically", variable=center_vertically_var)
+    center_vertically_check.grid(row=3, column=0, sticky='w', padx=5, pady=2)
+
+    dynamic_text_size_var = tk.BooleanVar()
+    dynamic_text_size_check = ttk.Checkbutton(frame_misc, text="Dynamic Text Size", variable=dynamic_text_size_var)
+    dynamic_text_size_check.grid(row=4, column=0, sticky='w', padx=5, pady=2)
+
+    # Vector draws modules as PDF paths; Raster embeds a PNG per label (for comparison)
+    qr_mode_var = tk.StringVar(value="Vector")
+    frame_qr_mode = ttk.Frame(frame_misc)
+    frame_qr_mode.grid(row=5, column=0, sticky='w', padx=5, pady=2)
+    ttk.Label(frame_qr_mode, text="QR Rendering:").grid(row=0, column=0, sticky='w')
+    qr_mode_options = ["Vector", "Raster", "Bitmap"]
+    qr_mode_menu = ttk.OptionMenu(frame_qr_mode, qr_mode_var, "Vector", *qr_mode_options)
+    qr_mode_menu.grid(row=0, column=1, sticky='w', padx=5)
+
+    # Worker processes used to encode QR codes (1 = encode on this process)
+    qr_workers_var = tk.StringVar(value="1")
+    frame_qr_workers = ttk.Frame(frame_misc)
+    frame_qr_workers.grid(row=6, column=0, sticky='w', padx=5, pady=2)
+    ttk.Label(frame_qr_workers, text="Encoding Workers:").grid(row=0, column=0, sticky='w')
+    ttk.Entry(frame_qr_workers, textvariable=qr_workers_var, width=5).grid(row=0, column=1, sticky='w', padx=5)
+
+    # Grid Adjustment Parameters
+    frame_grid = ttk.LabelFrame(frame_bottom, text="Grid Adjustment Parameters (mm)")
+    frame_grid.grid(row=0, column=1, padx=5, pady=5, sticky='nsew')
+    frame_grid.grid_columnconfigure(0, weight=1)
+    frame_grid.grid_columnconfigure(1, weight=1)
+
+    left_margin_var = tk.StringVar(value="4.05")
+    top_margin_var = tk.StringVar(value="12.837")
+    label_width_var = tk.StringVar(value="44.24")
+    label_height_var = tk.StringVar(value="12.47")
+    x_pitch_var = tk.StringVar(value="51.95")
+    y_pitch_var = tk.StringVar(value="12.6863")
+    labels_x_var = tk.StringVar(value="4")
+    labels_y_var = tk.StringVar(value="20")
+    label_start_index_var = tk.StringVar(value="0")
+
+    ttk.Label(frame_grid, text="Left Margin:").grid(row=0, column=0, sticky='e', padx=5, pady=2)
+    ttk.Entry(frame_grid, textvariable=left_margin_var, width=10).grid(row=0, column=1, sticky='w', padx=5, pady=2)
+
+    ttk.Label(frame_grid, text="Top Margin:").grid(row=1, column=0, sticky='e', padx=5, pady=2)
+    ttk.Entry(frame_grid, textvariable=top_margin_var, width=10).grid(row=1, column=1, sticky='w', padx=5, pady=2)
+
+    ttk.Label(frame_grid, text="Label Width:").grid(row=2, column=0, sticky='e', padx=5, pady=2)
+    ttk.Entry(frame_grid, textvariable=label_width_var, width=10).grid(row=2, column=1, sticky='w', padx=5, pady=2)
+
+    ttk.Label(frame_grid, text="Label Height:").grid(row=3, column=0, sticky='e', padx=5, pady=2)
+    ttk.Entry(frame_grid, textvariable=label_height_var, width=10).grid(row=3, column=1, sticky='w', padx=5, pady=2)
+
+    ttk.Label(frame_grid, text="X Pitch:").grid(row=4, column=0, sticky='e', padx=5, pady=2)
+    ttk.Entry(frame_grid, textvariable=x_pitch_var, width=10).grid(row=4, column=1, sticky='w', padx=5, pady=2)
+
+    ttk.Label(frame_grid, text="Y Pitch:").grid(row=5, column=0, sticky='e', padx=5, pady=2)
+    ttk.Entry(frame_grid, textvariable=y_pitch_var, width=10).grid(row=5, column=1, sticky='w', padx=5, pady=2)
+
+    ttk.Label(frame_grid, text="Labels in X:").grid(row=6, column=0, sticky='e', padx=5, pady=2)
+    ttk.Entry(frame_grid, textvariable=labels_x_var, width=10).grid(row=6, column=1, sticky='w', padx=5, pady=2)
+
+    ttk.Label(frame_grid, text="Labels in Y:").grid(row=7, column=0, sticky='e', padx=5, pady=2)
+    ttk.Entry(frame_grid, textvariable=labels_y_var, width=10).grid(row=7, column=1, sticky='w', padx=5, pady=2)
+
+    ttk.Label(frame_grid, text="Label Start Index:").grid(row=8, column=0, sticky='e', padx=5, pady=2)
+    ttk.Entry(frame_grid, textvariable=label_start_index_var, width=10).grid(row=8, column=1, sticky='w', padx=5, pady=2)
+
+    # Font Settings
+    frame_font = ttk.LabelFrame(frame_bottom, text="Font Settings")
+    frame_font.grid(row=0, column=2, padx=5, pady=5, sticky='nsew')
+    frame_font.grid_columnconfigure(0, weight=1)
+    frame_font.grid_columnconfigure(1, weight=1)
+
+    font_size_var = tk.StringVar(value="12")  # Increased default font size
+    font_family_var = tk.StringVar(value="Helvetica")
+    font_bold_var = tk.BooleanVar()
+    font_italic_var = tk.BooleanVar()
+    font_color_var = tk.StringVar(value="black")
+    text_justification_var = tk.StringVar(value="Left")
+
+    # Font families from the cache; refresh_font_families updates them after startup
+    available_fonts = list(load_font_families())
+
+    ttk.Label(frame_font, text="Font Size:").grid(row=0, column=0, sticky='e', padx=5, pady=2)
+    ttk.Entry(frame_font, textvariable=font_size_var, width=10).grid(row=0, column=1, sticky='w', padx=5, pady=2)
+
+    ttk.Label(frame_font, text="Font Family:").grid(row=1, column=0, sticky='e', padx=5, pady=2)
+    font_family_menu = ttk.Combobox(frame_font, textvariable=font_family_var, values=available_fonts, state="readonly", width=12)
+    font_family_menu.grid(row=1, column=1, sticky='w', padx=5, pady=2)
+    font_family_menu.set("Helvetica")  # Set default value
+
+    font_bold_check = ttk.Checkbutton(frame_font, text="Bold", variable=font_bold_var)
+    font_bold_check.grid(row=2, column=0, sticky='w', padx=5, pady=2)
+
+    font_italic_check = ttk.Checkbutton(frame_font, text="Italic", variable=font_italic_var)
+    font_italic_check.grid(row=2, column=1, sticky='w', padx=5, pady=2)
+
+    ttk.Label(frame_font, text="Font Color:").grid(row=3, column=0, sticky='e', padx=5, pady=2)
+    frame_font_color = ttk.Frame(frame_font)
+    frame_font_color.grid(row=3, column=1, sticky='w', padx=5, pady=2)
+    ttk.Entry(frame_font_color, textvariable=font_color_var, width=10).grid(row=0, column=0, sticky='w')
+    ttk.Button(frame_font_color, text="Choose", command=choose_color).grid(row=0, column=1, sticky='w', padx=5)
+
+    ttk.Label(frame_font, text="Justification:").grid(row=4, column=0, sticky='e', padx=5, pady=2)
+    justification_options = ["Left", "Center", "Right"]
+    justification_menu = ttk.OptionMenu(frame_font, text_justification_var, "Left", *justification_options)
+    justification_menu.grid(row=4, column=1, sticky='w', padx=5, pady=2)
+
+    # Lines that Dynamic Text Size may wrap long part numbers onto
+    max_text_lines_var = tk.StringVar(value="2")
+    ttk.Label(frame_font, text="Max Text Lines:").grid(row=5, column=0, sticky='e', padx=5, pady=2)
+    ttk.Entry(frame_font, textvariable=max_text_lines_var, width=10).grid(row=5, column=1, sticky='w', padx=5, pady=2)
+
+    # Header above the first row, drawn once and repeated on every sheet
+    header_text_var = tk.StringVar()
+    ttk.Label(frame_font, text="Header Text:").grid(row=6, column=0, sticky='e', padx=5, pady=2)
+    ttk.Entry(frame_font, textvariable=header_text_var, width=20).grid(row=6, column=1, sticky='w', padx=5, pady=2)
+
+    logo_file_var = tk.StringVar()
+    ttk.Label(frame_font, text="Header Logo:").grid(row=7, column=0, sticky='e', padx=5, pady=2)
+    frame_logo = ttk.Frame(frame_font)
+    frame_logo.grid(row=7, column=1, sticky='w', padx=5, pady=2)
+    ttk.Entry(frame_logo, textvariable=logo_file_var, width=10).grid(row=0, column=0, sticky='w')
+    ttk.Button(frame_logo, text="Browse", command=choose_logo).grid(row=0, column=1, sticky='w', padx=5)
+
+    # Add red note above the generate button
+    note_text = (
+        "Place in bypass tray with the label side down and with its header facing away from the printer.\n"
+        "Before printing ensure to print black and white to the bypass tray and set page sizing to Actual Size."
+    )
+    note_label = ttk.Label(root, text=note_text, foreground='red', justify='center')
+    note_label.grid(row=2, column=0, columnspan=3, pady=(0, 5))
+
+    # Generate and Cancel buttons with job progress
+    frame_actions = ttk.Frame(root)
+    frame_actions.grid(row=3, column=0, columnspan=3, pady=10)
+
+    generate_button = ttk.Button(frame_actions, text="Generate PDF", command=on_generate)
+    generate_button.grid(row=0, column=0, padx=5)
+
+    cancel_button = ttk.Button(frame_actions, text="Cancel", command=on_cancel)
+    cancel_button.grid(row=0, column=1, padx=5)
+    cancel_button.state(['disabled'])
+
+    progress_bar = ttk.Progressbar(frame_actions, orient='horizontal', length=300, mode='determinate')
+    progress_bar.grid(row=0, column=2, padx=5)
+
+    progress_var = tk.StringVar(value="")
+    ttk.Label(frame_actions, textvariable=progress_var, width=60).grid(row=0, column=3, sticky='w', padx=5)
+
+    # Bind keys
+    root.bind('<Escape>', on_escape)
+    root.bind('<Control-s>', on_ctrl_s)
+
+    # Trace variables to update preview
+    variables_to_trace = [
+        left_margin_var, top_margin_var, label_width_var, label_height_var,
+        x_pitch_var, y_pitch_var, labels_x_var, labels_y_var,
+        center_horizontally_var, center_vertically_var, draw_rectangles_var,
+        label_start_index_var, enable_qr_var, font_size_var, font_family_var,
+        font_bold_var, font_italic_var, font_color_var, text_justification_var
+    ]
+
+    for var in variables_to_trace:
+        var.trace_add('write', on_variable_change)
+
+    # Initial update of preview
+    schedule_preview()
+    root.after_idle(finish_startup)
+
+    root.mainloop()
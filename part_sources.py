@@ -0,0 +1,119 @@
+"""File-backed part number sources.
+
+PartFile memory-maps a plain text, CSV or TSV file and indexes the byte
+offset of every line, so any row can be read without loading the file:
+the GUI shows just the rows that are visible, and the renderer streams the
+rows straight from the mapping. Rows may also hold sequence specs (see
+sequences.py), which are expanded while iterating.
+"""
+import csv
+import io
+import mmap
+import os
+from array import array
+
+from sequences import count_lines, expand_lines
+
+DELIMITERS = {'.csv': ',', '.tsv': '\t', '.tab': '\t'}  # Anything else is one part number per line
+SNIFF_LINES = 20  # Lines sampled to detect a header row
+
+class PartFile:
+    def __init__(self, path, column=0, delimiter=None, header=None):
+        # column: index, or header name, of the part number column in CSV/TSV
+        # files. delimiter defaults to one chosen by extension (None for plain
+        # text). header defaults to True when column is a header name and to
+        # detecting a header row otherwise.
+        self.path = path
+        self.delimiter = delimiter if delimiter is not None else DELIMITERS.get(os.path.splitext(path)[1].lower())
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            # Empty files cannot be mapped
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        self._offsets = self._index_lines()
+
+        if header is None and self.delimiter is not None:
+            header = (isinstance(column, str) and not column.isdigit()) or self._sniff_header()
+        self.set_header(header)
+        self.select_column(column)
+
+    def _index_lines(self):
+        # Start offset of every line, plus the end of the data
+        data = self._data
+        offsets = array('Q', [3 if data[:3] == b'\xef\xbb\xbf' else 0])  # Skip a UTF-8 BOM
+        find = data.find
+        position = find(b'\n', offsets[0])
+        while position != -1:
+            offsets.append(position + 1)
+            position = find(b'\n', position + 1)
+        if offsets[-1] != len(data):
+            offsets.append(len(data))  # Last line without a newline
+        return offsets
+
+    def _sniff_header(self):
+        end = self._offsets[min(SNIFF_LINES, len(self._offsets) - 1)]
+        sample = self._data[self._offsets[0]:end].decode('utf-8', errors='replace')
+        try:
+            return csv.Sniffer().has_header(sample)
+        except csv.Error:
+            return False
+
+    def set_header(self, header):
+        # Treat the first row as column names (CSV/TSV only) or as data.
+        # Call select_column again afterwards.
+        self.header = None
+        self._first = 0  # Index of the first data row
+        if header and self.delimiter is not None and len(self._offsets) > 1:
+            self.header = self._cells(0)
+            self._first = 1
+
+    def first_row_cells(self):
+        # Cells of the first line of the file, header or not ([] if empty)
+        return self._cells(0) if len(self._offsets) > 1 else []
+
+    def select_column(self, column):
+        # Use the column with this index or header name for part numbers
+        if isinstance(column, str) and column.isdigit():
+            column = int(column)
+        if isinstance(column, str):
+            if self.header is None or column not in self.header:
+                raise ValueError(f"Column {column!r} not found in {os.path.basename(self.path)}.")
+            column = self.header.index(column)
+        self.column = column
+
+    def _line(self, index):
+        line = self._data[self._offsets[index]:self._offsets[index + 1]]
+        return line.decode('utf-8', errors='replace').rstrip('\r\n')
+
+    def _cells(self, index):
+        return next(csv.reader(io.StringIO(self._line(index)), delimiter=self.delimiter), [])
+
+    def __len__(self):
+        return len(self._offsets) - 1 - self._first
+
+    def row(self, index):
+        # Part number text of one row
+        index += self._first
+        if self.delimiter is None:
+            return self._line(index).strip()
+        cells = self._cells(index)
+        return cells[self.column].strip() if self.column < len(cells) else ''
+
+    def rows(self, start, stop):
+        # Rows start..stop-1 (clipped to the file), e.g. for a scrolled view
+        return [self.row(index) for index in range(max(start, 0), min(stop, len(self)))]
+
+    def values(self):
+        # Row texts streamed from the mapping, blank rows included
+        return (self.row(index) for index in range(len(self)))
+
+    def __iter__(self):
+        # Part numbers, as for text typed into the GUI
+        return expand_lines(self.values())
+
+    def count(self):
+        # Number of part numbers, with sequence specs counted by their length
+        return count_lines(self.values())
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
@@ -0,0 +1,121 @@
+"""Concatenate PDFs written by label_core into a single document.
+
+This only understands the plain layout reportlab produces (a classic xref
+table and one flat page tree per file). It is not a general purpose PDF
+merger, but it lets jobs be rendered in independent pieces and joined while
+holding a single piece in memory at a time.
+"""
+import hashlib
+import re
+from array import array
+
+_REF = re.compile(rb'(\d+) 0 R')
+_STREAM = re.compile(rb'>>\s*stream\r?\n')
+_OBJ_HEADER = re.compile(rb'\s*\d+ 0 obj\s*')
+_STARTXREF = re.compile(rb'startxref\s+(\d+)')
+
+PDF_HEADER = b'%PDF-1.4\n%\x93\x8c\x8b\x9e ReportLab Generated PDF document\n'
+
+def _ref(head, key):
+    # Object number referenced by /key in a dictionary, or None
+    match = re.search(rb'/' + key + rb'\s+(\d+) 0 R', head)
+    return int(match.group(1)) if match else None
+
+def read_pdf_objects(data):
+    # Split a reportlab PDF into {object number: body bytes} plus trailer refs
+    xref_offset = int(_STARTXREF.findall(data)[-1])
+    lines = data[xref_offset:].split(b'\n', 2)
+    first, count = (int(v) for v in lines[1].split())
+    table = lines[2]
+
+    offsets = {}
+    for i in range(count):
+        entry = table[i * 20:(i + 1) * 20]
+        if entry[17:18] == b'n':
+            offsets[first + i] = int(entry[:10])
+
+    # Each object runs up to the start of the next one (or the xref table),
+    # which avoids having to parse binary stream contents
+    ordered = sorted(offsets.items(), key=lambda item: item[1])
+    objects = {}
+    for index, (number, offset) in enumerate(ordered):
+        end = ordered[index + 1][1] if index + 1 < len(ordered) else xref_offset
+        body = data[offset:end].rstrip()
+        if body.endswith(b'endobj'):
+            body = body[:-len(b'endobj')].rstrip()
+        objects[number] = body[_OBJ_HEADER.match(body).end():]
+
+    trailer = data[data.rindex(b'trailer', 0, data.rindex(b'startxref')):]
+    return objects, _ref(trailer, b'Root'), _ref(trailer, b'Info')
+
+def _renumber(body, mapping):
+    # Rewrite object references in the dictionary part only, never in streams
+    match = _STREAM.search(body)
+    head, tail = (body[:match.start()], body[match.start():]) if match else (body, b'')
+    head = _REF.sub(lambda m: b'%d 0 R' % mapping[int(m.group(1))], head)
+    return head + tail
+
+def page_count(path):
+    # Number of pages in a PDF written by label_core / merge_pdfs
+    with open(path, 'rb') as f:
+        objects, root, _info = read_pdf_objects(f.read())
+    pages = objects[_ref(objects[root], b'Pages')]
+    return int(re.search(rb'/Count\s+(\d+)', pages).group(1))
+
+def merge_pdfs(input_paths, output_path):
+    # Write the pages of input_paths, in order, to output_path.
+    # Returns the number of pages written.
+    catalog_number, pages_number, info_number = 1, 2, 3
+    offsets = array('Q', [0, 0, 0])
+    kids = []
+    digest = hashlib.md5()
+
+    with open(output_path, 'wb') as out:
+        out.write(PDF_HEADER)
+
+        def write_object(number, body):
+            offsets[number - 1] = out.tell()
+            out.write(b'%d 0 obj\n' % number)
+            out.write(body)
+            out.write(b'\nendobj\n')
+
+        for path in input_paths:
+            with open(path, 'rb') as f:
+                data = f.read()
+            digest.update(data[-64:])
+            objects, root, info = read_pdf_objects(data)
+            del data
+
+            catalog = objects[root]
+            old_pages = _ref(catalog, b'Pages')
+            # Document level objects are replaced by the merged ones
+            skip = {root, info, old_pages, _ref(catalog, b'Outlines')}
+
+            mapping = {old_pages: pages_number}
+            for number in sorted(objects):
+                if number not in skip:
+                    offsets.append(0)
+                    mapping[number] = len(offsets)
+
+            kids.extend(mapping[int(n)] for n in _REF.findall(
+                re.search(rb'/Kids\s*\[(.*?)\]', objects[old_pages], re.S).group(1)))
+
+            for number in sorted(objects):
+                if number not in skip:
+                    write_object(mapping[number], _renumber(objects[number], mapping))
+
+        write_object(catalog_number, b'<< /PageMode /UseNone /Pages %d 0 R /Type /Catalog >>' % pages_number)
+        write_object(pages_number, b'<< /Count %d /Kids [ %s ] /Type /Pages >>' % (
+            len(kids), b' '.join(b'%d 0 R' % kid for kid in kids)))
+        write_object(info_number, b'<< /Producer (Avery 5167 QR Label Generator) >>')
+
+        xref_offset = out.tell()
+        out.write(b'xref\n0 %d\n0000000000 65535 f \n' % (len(offsets) + 1))
+        for offset in offsets:
+            out.write(b'%010d 00000 n \n' % offset)
+        file_id = digest.hexdigest().encode('ascii')
+        out.write(b'trailer\n<< /ID [<%s><%s>] /Info %d 0 R /Root %d 0 R /Size %d >>\n' % (
+            file_id, file_id, info_number, catalog_number, len(offsets) + 1))
+        out.write(b'startxref\n%d\n%%%%EOF\n' % xref_offset)
+
+    return len(kids)
@@ -0,0 +1,277 @@
+"""Bulk QR encoder that chooses and applies masks with NumPy.
+
+The qrcode package picks a mask by building the symbol eight times and
+scoring each one with pure Python loops over the module grid, which is
+most of its cost per code. Here payloads are grouped by QR version and
+each group is encoded as one stacked array: Reed-Solomon error correction
+runs over the whole group at once, the codewords are placed into the grid
+with one indexed assignment, and all eight masks are applied and scored
+together. Segmenting the payload into modes is left to qrcode. The
+resulting matrices are identical to qrcode.QRCode(...).make(fit=True)
+.get_matrix(); check_conformance compares the two.
+
+NumPy is optional. Callers should check AVAILABLE and fall back to qrcode.
+"""
+from bisect import bisect_left
+from functools import lru_cache
+
+import qrcode
+from qrcode import LUT, base, exceptions, util
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+AVAILABLE = np is not None
+BATCH_CELLS = 1 << 22  # Upper bound on payloads x masks x modules scored at once
+
+# Finder-like patterns penalised by the third scoring rule (1:1:3:1:1 with
+# four light modules on either side)
+_FINDER_PATTERNS = ((1, 0, 1, 1, 1, 0, 1, 0, 0, 0, 0), (0, 0, 0, 0, 1, 0, 1, 1, 1, 0, 1))
+
+def _function_modules(version, error_correction, mask_pattern, test):
+    # Module grid with only the function patterns set (data cells are None),
+    # built with qrcode's own setup code so the fixed parts match exactly
+    qr = qrcode.QRCode(version=version, error_correction=error_correction)
+    count = qr.modules_count = version * 4 + 17
+    qr.modules = [[None] * count for _ in range(count)]
+    qr.setup_position_probe_pattern(0, 0)
+    qr.setup_position_probe_pattern(count - 7, 0)
+    qr.setup_position_probe_pattern(0, count - 7)
+    qr.setup_position_adjust_pattern()
+    qr.setup_timing_pattern()
+    qr.setup_type_info(test, mask_pattern)
+    if version >= 7:
+        qr.setup_type_number(test)
+    return qr.modules
+
+def _data_positions(modules):
+    # Flat indices of the data cells in the order qrcode's map_data fills them
+    count = len(modules)
+    positions = []
+    inc = -1
+    row = count - 1
+    for col in range(count - 1, 0, -2):
+        if col <= 6:
+            col -= 1
+        while True:
+            for c in (col, col - 1):
+                if modules[row][c] is None:
+                    positions.append(row * count + c)
+            row += inc
+            if row < 0 or count <= row:
+                row -= inc
+                inc = -inc
+                break
+    return np.array(positions, dtype=np.intp)
+
+@lru_cache(maxsize=1)
+def _gf_multiply_table():
+    # Products of every pair of GF(256) elements, using qrcode's log tables
+    table = np.zeros((256, 256), dtype=np.uint8)
+    for a in range(1, 256):
+        for b in range(1, 256):
+            table[a, b] = base.gexp(base.glog(a) + base.glog(b))
+    return table
+
+def _rs_generator(ec_count):
+    # Generator polynomial coefficients (highest power first), as create_bytes makes them
+    if ec_count in LUT.rsPoly_LUT:
+        return list(base.Polynomial(LUT.rsPoly_LUT[ec_count], 0))
+    poly = base.Polynomial([1], 0)
+    for i in range(ec_count):
+        poly = poly * base.Polynomial([1, base.gexp(i)], 0)
+    return list(poly)
+
+@lru_cache(maxsize=None)
+def _version_tables(version, error_correction):
+    # Per-version arrays shared by every payload of that version:
+    # Reed-Solomon blocks, the interleaving order of the final codewords,
+    # data cell order, the function patterns used while scoring and in the
+    # final symbol (per mask), and the cells each mask inverts
+    blocks = []
+    dc_columns, ec_columns = [], []
+    offset = ec_offset = 0
+    for block in base.rs_blocks(version, error_correction):
+        ec_count = block.total_count - block.data_count
+        blocks.append((offset, block.data_count, np.array(_rs_generator(ec_count)[1:], dtype=np.uint8)))
+        dc_columns.append(list(range(offset, offset + block.data_count)))
+        ec_columns.append(list(range(ec_offset, ec_offset + ec_count)))
+        offset += block.data_count
+        ec_offset += ec_count
+    # Codewords are interleaved block by block: data first, then error correction
+    order = [column[i] for i in range(max(map(len, dc_columns))) for column in dc_columns if i < len(column)]
+    order += [offset + column[i] for i in range(max(map(len, ec_columns))) for column in ec_columns
+              if i < len(column)]
+
+    template = _function_modules(version, error_correction, 0, True)
+    count = len(template)
+    positions = _data_positions(template)
+    data_cells = np.array([[cell is None for cell in row] for row in template])
+    scoring_base = np.array([[bool(cell) for cell in row] for row in template])
+    final_base = np.array([
+        [[bool(cell) for cell in row] for row in _function_modules(version, error_correction, mask, False)]
+        for mask in range(8)
+    ])
+    flips = np.array([
+        [[bool(mask_func(i, j)) for j in range(count)] for i in range(count)]
+        for mask_func in map(util.mask_func, range(8))
+    ]) & data_cells
+    return blocks, np.array(order, dtype=np.intp), positions, scoring_base, final_base, flips
+
+class _BitWriter:
+    # Stand-in for util.BitBuffer that packs bits into one integer
+    __slots__ = ('value', 'length')
+
+    def __init__(self):
+        self.value = 0
+        self.length = 0
+
+    def put(self, num, length):
+        self.value = (self.value << length) | (num & ((1 << length) - 1))
+        self.length += length
+
+    def __len__(self):
+        return self.length
+
+def _segment_bits(data_list, version):
+    # Mode, length and data bits of every segment, as create_data writes them
+    writer = _BitWriter()
+    mode_sizes = util.mode_sizes_for_version(version)
+    for data in data_list:
+        writer.put(data.mode, 4)
+        writer.put(len(data), mode_sizes[data.mode])
+        data.write(writer)
+    return writer
+
+def _data_codewords(payload, error_correction):
+    # (version, data codewords) exactly as QRCode.best_fit and create_data
+    # choose them, with the add_data default of optimize=20
+    data_list = list(util.optimal_data_chunks(payload, minimum=20))
+    version = 1
+    while True:
+        bits = _segment_bits(data_list, version)
+        fitted = bisect_left(util.BIT_LIMIT_TABLE[error_correction], len(bits), version)
+        if fitted == 41:
+            # Too long for any version: let qrcode raise its usual error
+            qr = qrcode.QRCode(error_correction=error_correction)
+            qr.add_data(payload)
+            qr.make(fit=True)
+            raise exceptions.DataOverflowError()
+        if util.mode_sizes_for_version(fitted) is util.mode_sizes_for_version(version):
+            version = fitted
+            break
+        version = fitted
+
+    bit_limit = util.BIT_LIMIT_TABLE[error_correction][version]
+    bits.put(0, min(bit_limit - len(bits), 4))  # Terminator
+    bits.put(0, -len(bits) % 8)  # Byte alignment
+    codewords = bits.value.to_bytes(len(bits) // 8, 'big')
+    pad = bytes((util.PAD0, util.PAD1)) * (bit_limit // 16 + 1)
+    return version, codewords + pad[:bit_limit // 8 - len(codewords)]
+
+def _error_correction(data, generator):
+    # Reed-Solomon remainders for a stack of data blocks (one per row),
+    # shifting one data codeword through every row's register per step
+    multiply = _gf_multiply_table()
+    remainder = np.zeros((data.shape[0], len(generator)), dtype=np.uint8)
+    for column in data.T:
+        factor = column ^ remainder[:, 0]
+        remainder[:, :-1] = remainder[:, 1:]
+        remainder[:, -1] = 0
+        remainder ^= multiply[factor[:, None], generator]
+    return remainder
+
+def _run_penalty(grids):
+    # Rule 1 along the last axis: every run of five or more same-coloured
+    # modules costs its length minus two. A run of length L holds L - 4
+    # windows of five, so the cost is windows + 2 * runs.
+    same = grids[..., 1:] == grids[..., :-1]
+    five = same[..., :-3] & same[..., 1:-2] & same[..., 2:-1] & same[..., 3:]
+    starts = five.copy()
+    starts[..., 1:] &= ~same[..., :-4]
+    return five.sum(axis=(-2, -1)) + 2 * starts.sum(axis=(-2, -1))
+
+def _finder_penalty(grids):
+    # Rule 3 along the last axis: 40 for every window matching either pattern
+    width = grids.shape[-1] - 10
+    matches = []
+    for pattern in _FINDER_PATTERNS:
+        match = np.ones(grids.shape[:-1] + (width,), dtype=bool)
+        for offset, dark in enumerate(pattern):
+            window = grids[..., offset:offset + width]
+            match &= window if dark else ~window
+        matches.append(match)
+    return 40 * (matches[0] | matches[1]).sum(axis=(-2, -1))
+
+def lost_points(grids):
+    # Vectorised util.lost_point over the last two axes of a bool array
+    count = grids.shape[-1]
+    columns = grids.swapaxes(-2, -1)
+    points = _run_penalty(grids) + _run_penalty(columns)
+
+    # Rule 2: 3 for every 2x2 block of one colour
+    across = grids[..., :, 1:] == grids[..., :, :-1]
+    down = grids[..., 1:, :-1] == grids[..., :-1, :-1]
+    points += 3 * (across[..., :-1, :] & across[..., 1:, :] & down).sum(axis=(-2, -1))
+
+    points += _finder_penalty(grids) + _finder_penalty(columns)
+
+    # Rule 4: 10 for every 5% the dark share departs from 50%, computed with
+    # the same float operations as qrcode
+    percent = grids.sum(axis=(-2, -1)).astype(np.float64) / (count ** 2)
+    points += 10 * np.trunc(np.abs(percent * 100 - 50) / 5).astype(points.dtype)
+    return points
+
+def _encode_version(payload_codewords, version, error_correction):
+    # Encode payloads that share a version; returns an array of module grids
+    blocks, order, positions, scoring_base, final_base, flips = _version_tables(version, error_correction)
+    count = scoring_base.shape[0]
+    data_codewords = np.frombuffer(b''.join(payload_codewords), dtype=np.uint8).reshape(len(payload_codewords), -1)
+    codewords = np.concatenate(
+        [data_codewords] + [_error_correction(data_codewords[:, offset:offset + data_count], generator)
+                            for offset, data_count, generator in blocks],
+        axis=1)[:, order]
+
+    bits = np.unpackbits(codewords, axis=1)
+    data = np.zeros((len(payload_codewords), count * count), dtype=bool)
+    data[:, positions[:bits.shape[1]]] = bits
+    data = data.reshape(-1, 1, count, count)
+
+    best = np.empty(len(payload_codewords), dtype=np.intp)
+    step = max(1, BATCH_CELLS // (8 * count * count))
+    for start in range(0, len(payload_codewords), step):
+        candidates = scoring_base | (data[start:start + step] ^ flips)
+        best[start:start + step] = lost_points(candidates).argmin(axis=1)
+    return final_base[best] | (data[:, 0] ^ flips[best])
+
+def encode_matrices(payloads, error_correction, border):
+    # Module matrices (border included, as tuples of bool rows) for payloads,
+    # in order. Same output as qrcode's get_matrix() after make(fit=True).
+    by_version = {}
+    for index, payload in enumerate(payloads):
+        version, codewords = _data_codewords(payload, error_correction)
+        indices, words = by_version.setdefault(version, ([], []))
+        indices.append(index)
+        words.append(codewords)
+
+    matrices = [None] * len(payloads)
+    for version, (indices, words) in by_version.items():
+        grids = _encode_version(words, version, error_correction)
+        if border:
+            grids = np.pad(grids, ((0, 0), (border, border), (border, border)))
+        for index, grid in zip(indices, grids.tolist()):
+            matrices[index] = tuple(map(tuple, grid))
+    return matrices
+
+def check_conformance(payloads, error_correction, border):
+    # Payloads whose matrix differs from the one the qrcode package makes
+    mismatches = []
+    for payload, matrix in zip(payloads, encode_matrices(payloads, error_correction, border)):
+        qr = qrcode.QRCode(error_correction=error_correction, border=border)
+        qr.add_data(payload)
+        qr.make(fit=True)
+        if matrix != tuple(tuple(row) for row in qr.get_matrix()):
+            mismatches.append(payload)
+    return mismatches
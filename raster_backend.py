@@ -0,0 +1,270 @@
+"""Raster page output: label sheets rendered straight to bitmaps.
+
+An alternative to the reportlab canvas for printers and inspection systems
+that take page images. Every sheet is drawn into a NumPy page buffer at the
+chosen resolution: QR module matrices are scaled up with np.repeat and
+written into the page by slicing, and text is composited from a cache of
+anti-aliased glyph bitmaps. Positions come from the same SheetLayout and
+label_core.place_label_text as the PDF, and text is advanced with the same
+reportlab font metrics, so both outputs line up.
+
+Pages are written one at a time as a multi-page TIFF (Group 4 compressed
+when 1-bit), or as a sequence of raw PBM (1-bit) or PGM (grayscale) images.
+The standard PDF fonts are drawn with an installed substitute (see
+font_registry.SUBSTITUTE_FAMILIES).
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import replace
+from functools import lru_cache
+from typing import Callable, Iterable, Optional
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont, TiffImagePlugin
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+import font_registry
+from instrumentation import NULL_TIMER, StageTimer
+from label_core import (GenerationCancelled, GenerationResult, HEADER_LOGO_MAX_HEIGHT_MM, LabelSettings,
+                        QR_CACHE_SIZE, iter_qr_matrices, iter_shards, mm_to_points, place_label_text,
+                        resolve_color)
+from label_layout import SheetLayout
+
+DEFAULT_DPI = 300
+RASTER_EXTENSIONS = ('.tif', '.tiff', '.pbm', '.pgm')
+GLYPH_CACHE_SIZE = 8192  # Rendered glyphs kept per job
+WHITE = 255
+
+@lru_cache(maxsize=64)
+def _load_font(font_file, pixel_size):
+    if font_file is None:
+        return ImageFont.load_default(pixel_size)
+    path, subfont_index = font_file
+    return ImageFont.truetype(path, pixel_size, index=subfont_index)
+
+class GlyphCache:
+    # Anti-aliased glyph coverage bitmaps keyed by (pixel size, character),
+    # with the offset of their top-left corner from the pen position on the
+    # baseline, least recently used first
+    def __init__(self, font_file, max_size=GLYPH_CACHE_SIZE):
+        self.font_file = font_file
+        self.max_size = max_size
+        self.glyphs = OrderedDict()
+
+    def glyph(self, pixel_size, char):
+        key = (pixel_size, char)
+        glyph = self.glyphs.get(key)
+        if glyph is not None:
+            self.glyphs.move_to_end(key)
+            return glyph
+        font = _load_font(self.font_file, pixel_size)
+        left, top, right, bottom = font.getbbox(char, anchor='ls')
+        image = Image.new('L', (max(right - left, 1), max(bottom - top, 1)), 0)
+        ImageDraw.Draw(image).text((-left, -top), char, font=font, fill=255, anchor='ls')
+        glyph = self.glyphs[key] = (np.asarray(image), left, top)
+        if len(self.glyphs) > self.max_size:
+            self.glyphs.popitem(last=False)
+        return glyph
+
+class PageRenderer:
+    # Draws label content into page buffers (uint8, 255 = white) using
+    # SheetLayout positions in points, converted at dpi
+    def __init__(self, layout, settings, dpi=DEFAULT_DPI):
+        self.layout = layout
+        self.settings = settings
+        self.scale = dpi / 72
+        self.shape = (round(layout.page_height * self.scale), round(layout.page_width * self.scale))
+        self.font_name = settings.font_name
+        self.glyphs = GlyphCache(font_registry.font_file(settings.font_family, settings.font_bold,
+                                                         settings.font_italic))
+        # Page value for every glyph coverage value, blending toward the text colour
+        color = resolve_color(settings.font_color)
+        ink = WHITE * (0.299 * color.red + 0.587 * color.green + 0.114 * color.blue)
+        self.ink = np.round(WHITE - np.arange(256) * (WHITE - ink) / 255).astype(np.uint8)
+        self.qr_blocks = OrderedDict()  # Scaled QR bitmaps by payload
+        self.template = self._template()
+
+    def _x(self, x):
+        return round(x * self.scale)
+
+    def _y(self, y):
+        # Pixel row for a PDF y coordinate (origin at the bottom of the page)
+        return round((self.layout.page_height - y) * self.scale)
+
+    def _template(self):
+        # Content shared by every sheet (the PDF's sheet form XObject)
+        layout, settings = self.layout, self.settings
+        page = np.full(self.shape, WHITE, dtype=np.uint8)
+        if settings.draw_rectangles:
+            image = Image.fromarray(page)
+            draw = ImageDraw.Draw(image)
+            for slot in layout.slots:
+                draw.rounded_rectangle(
+                    (self._x(slot.x), self._y(slot.y + layout.label_height),
+                     self._x(slot.x + layout.label_width), self._y(slot.y)),
+                    radius=round(5 * self.scale), outline=0, width=max(round(self.scale), 1))
+            page = np.array(image)
+
+        band_middle = layout.page_height - layout.header_height / 2
+        logo_height = min(layout.header_height - 2 * layout.padding, mm_to_points(HEADER_LOGO_MAX_HEIGHT_MM))
+        if settings.logo_file and logo_height > 0:
+            with Image.open(settings.logo_file) as logo:
+                logo = logo.convert('LA')
+                size = (max(round(logo_height * logo.width / logo.height * self.scale), 1),
+                        max(round(logo_height * self.scale), 1))
+                logo = logo.resize(size, Image.LANCZOS)
+            image = Image.fromarray(page)
+            image.paste(logo.getchannel('L'), (self._x(layout.slots[0].x), self._y(band_middle + logo_height / 2)),
+                        logo.getchannel('A'))
+            page = np.array(image)
+        if settings.header_text:
+            self.draw_text(page, layout.page_width / 2, band_middle - settings.font_size / 3, settings.header_text,
+                           settings.font_size, 'Center')
+        return page
+
+    def new_page(self):
+        return self.template.copy()
+
+    def draw_qr(self, page, part, matrix, x, y, size):
+        # Scale the module matrix to whole pixels, spreading the rounding
+        # over the modules, and darken its dark modules in the page
+        x0, y0 = self._x(x), self._y(y + size)
+        side = self._x(x + size) - x0
+        block = self.qr_blocks.get(part)
+        if block is None or block.shape[0] != side:
+            modules = np.array(matrix, dtype=bool)
+            counts = np.diff(np.round(np.linspace(0, side, len(matrix) + 1)).astype(np.intp))
+            block = self.qr_blocks[part] = modules.repeat(counts, axis=0).repeat(counts, axis=1)
+            if len(self.qr_blocks) > QR_CACHE_SIZE:
+                self.qr_blocks.popitem(last=False)
+        else:
+            self.qr_blocks.move_to_end(part)
+        region = page[y0:y0 + side, x0:x0 + side]
+        region[block[:region.shape[0], :region.shape[1]]] = 0
+
+    def draw_text(self, page, x, y, text, font_size, justification='Left'):
+        # Draw text with its baseline at y and x as the justification anchor.
+        # The pen advances by the PDF font metrics so glyphs land where the
+        # PDF places them.
+        if justification != 'Left':
+            width = stringWidth(text, self.font_name, font_size)
+            x -= width / 2 if justification == 'Center' else width
+        pixel_size = max(font_size * self.scale, 1)
+        baseline = self._y(y)
+        height, width = page.shape
+        for char in text:
+            coverage, left, top = self.glyphs.glyph(pixel_size, char)
+            column, row = self._x(x) + left, baseline + top
+            x += stringWidth(char, self.font_name, font_size)
+            # Clip the glyph to the page
+            c0, r0 = max(column, 0), max(row, 0)
+            c1, r1 = min(column + coverage.shape[1], width), min(row + coverage.shape[0], height)
+            if c0 >= c1 or r0 >= r1:
+                continue
+            region = page[r0:r1, c0:c1]
+            np.minimum(region, self.ink[coverage[r0 - row:r1 - row, c0 - column:c1 - column]], out=region)
+
+def iter_pages(part_numbers, settings, dpi=DEFAULT_DPI, stats=None, progress=None, cancel_event=None,
+               timer=NULL_TIMER):
+    # Page buffers for the job, one sheet at a time, in the same slots as
+    # generate_pdf. stats collects QR cache 'hits' and 'misses' plus
+    # 'sheets' and 'labels'.
+    layout = SheetLayout.from_settings(settings)
+    renderer = PageRenderer(layout, settings, dpi)
+    if stats is None:
+        stats = {}
+    stats.update(hits=0, misses=0, sheets=0, labels=0)
+    if settings.enable_qr:
+        labels = iter_qr_matrices(part_numbers, settings.qr_workers, stats=stats, timer=timer,
+                                  fast=settings.fast_qr)
+    else:
+        labels = ((part, None) for part in part_numbers)
+    try:
+        for sheet, first_slot in iter_shards(labels, replace(settings, shard_sheets=1)):
+            if cancel_event is not None and cancel_event.is_set():
+                raise GenerationCancelled()
+            page = renderer.new_page()
+            for slot, (part, matrix) in zip(layout.slots[first_slot:], sheet):
+                if part.strip() == '':
+                    continue
+                if settings.enable_qr:
+                    with timer.stage('qr_draw'):
+                        renderer.draw_qr(page, part, matrix, slot.qr_x, slot.qr_y, layout.qr_size)
+                font_size, placements = place_label_text(part, slot, layout, settings, renderer.font_name, timer)
+                with timer.stage('text_draw'):
+                    for x, y, line in placements:
+                        renderer.draw_text(page, x, y, line, font_size, settings.text_justification)
+            stats['sheets'] += 1
+            stats['labels'] += len(sheet)
+            yield page
+            if progress is not None:
+                progress(stats['labels'], stats['sheets'])
+    finally:
+        if settings.enable_qr:
+            labels.close()
+
+def write_tiff(pages, output_file, dpi, grayscale):
+    # Append pages to a multi-page TIFF one at a time (Image.save with
+    # save_all would collect every page first)
+    with open(output_file, 'w+b') as f, TiffImagePlugin.AppendingTiffWriter(f) as tiff:
+        for page in pages:
+            image = Image.fromarray(page) if grayscale else Image.fromarray(page >= 128)
+            image.save(tiff, format='TIFF', dpi=(dpi, dpi), compression='tiff_lzw' if grayscale else 'group4')
+            tiff.newFrame()
+
+def write_netpbm(pages, output_file, grayscale):
+    # Raw PGM (P5) or PBM (P4) images, one after another in the same file
+    with open(output_file, 'wb') as f:
+        for page in pages:
+            height, width = page.shape
+            if grayscale:
+                f.write(b'P5\n%d %d\n255\n' % (width, height))
+                f.write(page.tobytes())
+            else:
+                f.write(b'P4\n%d %d\n' % (width, height))
+                f.write(np.packbits(page < 128, axis=1).tobytes())  # 1 = black
+
+def generate_raster(part_numbers: Iterable[str], output_file: str, settings: LabelSettings,
+                    dpi: int = DEFAULT_DPI, grayscale: bool = False,
+                    progress: Optional[Callable[[int, int], None]] = None,
+                    cancel_event: Optional[threading.Event] = None,
+                    timer: Optional[StageTimer] = None) -> GenerationResult:
+    # Render the job as page images; the format follows the extension of
+    # output_file (.tif/.tiff, .pbm which is always 1-bit, or .pgm which is
+    # always grayscale). progress, cancel_event and timer work as in
+    # generate_pdf.
+    settings.validate()
+    extension = os.path.splitext(output_file)[1].lower()
+    if extension not in RASTER_EXTENSIONS:
+        raise ValueError(f"Raster output must be one of {', '.join(RASTER_EXTENSIONS)}, not {output_file!r}.")
+    if grayscale and extension == '.pbm':
+        raise ValueError("PBM output is 1-bit; use .pgm or .tif for grayscale.")
+    if dpi <= 0:
+        raise ValueError("dpi must be positive.")
+    start_time = time.perf_counter()
+    if timer is None:
+        timer = NULL_TIMER
+    stats = {}
+    pages = iter_pages(part_numbers, settings, dpi, stats, progress, cancel_event, timer)
+    try:
+        if extension in ('.tif', '.tiff'):
+            write_tiff(pages, output_file, dpi, grayscale)
+        else:
+            write_netpbm(pages, output_file, extension == '.pgm')
+    except BaseException:
+        if os.path.exists(output_file):
+            os.remove(output_file)
+        raise
+    done = time.perf_counter()
+    return GenerationResult(
+        output_file=output_file,
+        sheet_count=stats['sheets'],
+        label_count=stats['labels'],
+        qr_cache_hits=stats['hits'],
+        qr_cache_misses=stats['misses'],
+        timings={'render': done - start_time, 'total': done - start_time},
+        stages=timer.report(),
+        pdf_bytes=os.path.getsize(output_file),  # Size of the image file
+    )
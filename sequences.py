@@ -0,0 +1,121 @@
+"""Compact specs for serialized label runs.
+
+A line such as ``BIN-A-{00001..50000}`` stands for BIN-A-00001 ... BIN-A-50000
+and is expanded lazily, one part number at a time, so a run of any length
+never exists as a list. Ranges follow shell brace syntax:
+
+    {1..100}            1, 2, ... 100
+    {00001..50000}      zero padded to the width of the wider end
+    {0010..0100..10}    every 10th number
+    {100..1}            counting down
+    {1..500:luhn}       followed by a check digit (luhn, gs1 or mod97)
+
+A line can hold several ranges; the last one varies fastest, e.g.
+``RACK-{1..4}-{01..20}``. Lines without a range are used as they are.
+"""
+import re
+
+_RANGE = re.compile(r'\{(\d+)\.\.(\d+)(?:\.\.(\d+))?(?::(\w+))?\}')
+
+def luhn_digit(digits):
+    # Luhn (mod 10) check digit
+    total = 0
+    for index, digit in enumerate(reversed(digits)):
+        value = int(digit) * (2 if index % 2 == 0 else 1)
+        total += value - 9 if value > 9 else value
+    return str(-total % 10)
+
+def gs1_digit(digits):
+    # GS1 / GTIN check digit: weights 3 and 1 from the right
+    total = sum(int(digit) * (3 if index % 2 == 0 else 1) for index, digit in enumerate(reversed(digits)))
+    return str(-total % 10)
+
+def mod97_digits(digits):
+    # ISO 7064 MOD 97-10 check digits (two digits)
+    return f"{98 - int(digits + '00') % 97:02d}"
+
+CHECKSUMS = {'luhn': luhn_digit, 'gs1': gs1_digit, 'mod97': mod97_digits}
+
+class NumberRange:
+    # One {start..stop..step:checksum} range
+    def __init__(self, start, stop, step=None, checksum=None):
+        # Shell rule: zero padded when either end is written with a leading zero
+        padded = any(len(end) > 1 and end.startswith('0') for end in (start, stop))
+        self.width = max(len(start), len(stop)) if padded else 0
+        self.start = int(start)
+        self.stop = int(stop)
+        self.step = int(step) if step else 1
+        if self.step == 0:
+            raise ValueError("Sequence step must not be 0.")
+        if checksum is not None and checksum not in CHECKSUMS:
+            raise ValueError(f"Unknown checksum {checksum!r} (use {', '.join(CHECKSUMS)}).")
+        self.check = CHECKSUMS.get(checksum)
+
+    def __len__(self):
+        return abs(self.stop - self.start) // self.step + 1
+
+    def __iter__(self):
+        step = self.step if self.stop >= self.start else -self.step
+        for number in range(self.start, self.stop + (1 if step > 0 else -1), step):
+            digits = f"{number:0{self.width}d}"
+            yield digits + self.check(digits) if self.check else digits
+
+class Sequence:
+    # A parsed spec: literal text and NumberRanges, expanded on iteration
+    def __init__(self, spec):
+        self.spec = spec
+        self.pieces = []
+        position = 0
+        for match in _RANGE.finditer(spec):
+            self.pieces.append(spec[position:match.start()])
+            self.pieces.append(NumberRange(*match.groups()))
+            position = match.end()
+        if position == 0:
+            raise ValueError(f"No {{start..stop}} range in sequence {spec!r}.")
+        self.pieces.append(spec[position:])
+
+    def __len__(self):
+        count = 1
+        for piece in self.pieces:
+            if isinstance(piece, NumberRange):
+                count *= len(piece)
+        return count
+
+    def __iter__(self):
+        return self._expand(0, '')
+
+    def _expand(self, index, prefix):
+        # Depth-first over the pieces so only the current values are held
+        if index == len(self.pieces):
+            yield prefix
+            return
+        piece = self.pieces[index]
+        if isinstance(piece, str):
+            yield from self._expand(index + 1, prefix + piece)
+            return
+        for value in piece:
+            yield from self._expand(index + 1, prefix + value)
+
+def is_sequence(line):
+    return _RANGE.search(line) is not None
+
+def expand_lines(lines):
+    # Part numbers for input lines: blank lines are skipped, sequence specs
+    # are expanded lazily and other lines are used as they are
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if is_sequence(line):
+            yield from Sequence(line)
+        else:
+            yield line
+
+def count_lines(lines):
+    # Number of part numbers expand_lines(lines) yields, without expanding
+    total = 0
+    for line in lines:
+        line = line.strip()
+        if line:
+            total += len(Sequence(line)) if is_sequence(line) else 1
+    return total
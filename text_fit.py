@@ -0,0 +1,116 @@
+"""Fit label text to the space next to the QR code.
+
+Text width in a given font scales linearly with the font size, so the size
+that fits is computed from a single measurement instead of stepping down
+and re-measuring. Results are memoized, which matters for jobs that repeat
+part numbers.
+"""
+import math
+from functools import lru_cache
+
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+MIN_FONT_SIZE = 6  # Never shrink text below this size
+FONT_SIZE_STEP = 0.5  # Sizes are snapped down to this grid
+LINE_SPACING = 1.15  # Line height as a multiple of the font size
+BREAK_AFTER = ' -_/.,:;'  # Preferred places to wrap a part number
+FIT_CACHE_SIZE = 8192
+
+def snap_font_size(font_size, fitting_size, min_size=MIN_FONT_SIZE, step=FONT_SIZE_STEP):
+    # Largest size on the font_size - n * step grid that is <= fitting_size,
+    # clamped to min_size (the old step-down loop's results, without the loop)
+    if fitting_size >= font_size or font_size <= min_size:
+        return font_size
+    steps = math.ceil((font_size - fitting_size) / step - 1e-9)
+    return max(font_size - steps * step, min_size)
+
+@lru_cache(maxsize=FIT_CACHE_SIZE)
+def fit_font_size(text, font_name, font_size, available_width, min_size=MIN_FONT_SIZE):
+    # Font size at which text fits on one line of available_width points
+    width = stringWidth(text, font_name, font_size)
+    if width <= available_width:
+        return font_size
+    return snap_font_size(font_size, font_size * available_width / width, min_size)
+
+def _tokens(text, by_separator):
+    # Pieces a line may be broken between: after separators, or between characters
+    if not by_separator:
+        return list(text)
+    tokens = []
+    start = 0
+    for index, char in enumerate(text):
+        if char in BREAK_AFTER:
+            tokens.append(text[start:index + 1])
+            start = index + 1
+    if start < len(text):
+        tokens.append(text[start:])
+    return tokens
+
+def _balanced_split(tokens, widths, line_count):
+    # Split tokens into exactly line_count contiguous lines so that the widest
+    # line is as narrow as possible. Returns (widest width, lines).
+    count = len(tokens)
+    prefix = [0.0]
+    for width in widths:
+        prefix.append(prefix[-1] + width)
+
+    # best[k][i]: (widest line, break points) for the first i tokens on k lines
+    best = [[(math.inf, ())] * (count + 1) for _ in range(line_count + 1)]
+    best[0][0] = (0.0, ())
+    for lines in range(1, line_count + 1):
+        for end in range(lines, count + 1):
+            for start in range(lines - 1, end):
+                previous, breaks = best[lines - 1][start]
+                widest = max(previous, prefix[end] - prefix[start])
+                if widest < best[lines][end][0]:
+                    best[lines][end] = (widest, breaks + (start,))
+
+    widest, breaks = best[line_count][count]
+    bounds = list(breaks[1:]) + [count]
+    lines = []
+    start = 0
+    for end in bounds:
+        lines.append(''.join(tokens[start:end]).strip())
+        start = end
+    return widest, tuple(lines)
+
+def wrap_text(text, font_name, line_count):
+    # Break text into line_count lines of balanced width. Separator breaks are
+    # preferred unless they leave the lines much less even than breaking
+    # between any two characters.
+    candidates = []
+    for by_separator in (True, False):
+        tokens = _tokens(text, by_separator)
+        if len(tokens) >= line_count:
+            widths = [stringWidth(token, font_name, 1) for token in tokens]
+            candidates.append(_balanced_split(tokens, widths, line_count))
+    if not candidates:
+        return (text,)
+    if len(candidates) == 2 and candidates[0][0] > candidates[1][0] * 1.25:
+        return candidates[1][1]
+    return candidates[0][1]
+
+@lru_cache(maxsize=FIT_CACHE_SIZE)
+def fit_text(text, font_name, font_size, available_width, available_height,
+             max_lines=1, min_size=MIN_FONT_SIZE):
+    # Choose the line count (up to max_lines) and font size that show text as
+    # large as possible inside available_width x available_height points.
+    # When even min_size overflows, the layout that overflows least wins.
+    # Returns (font size, lines). Fewer lines win ties.
+    def rank(size, widest):
+        return size, -max(widest * size - available_width, 0)
+
+    best_size = fit_font_size(text, font_name, font_size, available_width, min_size)
+    best_lines = (text,)
+    best_rank = rank(best_size, stringWidth(text, font_name, 1))
+    for line_count in range(2, min(max_lines, len(text)) + 1):
+        if best_rank == (font_size, 0):
+            break  # Already full size without overflow
+        lines = wrap_text(text, font_name, line_count)
+        widest = max(stringWidth(line, font_name, 1) for line in lines)
+        fitting_size = min(available_width / widest if widest else font_size,
+                           available_height / (line_count * LINE_SPACING))
+        size = snap_font_size(font_size, fitting_size, min_size)
+        if rank(size, widest) > best_rank:
+            best_size, best_lines, best_rank = size, lines, rank(size, widest)
+    return best_size, best_lines